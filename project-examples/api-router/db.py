@@ -16,3 +16,4 @@ class Todo:
 db = database('todos.db')
 db.projects = db.create(Project)
 db.todos = db.create(Todo)
+db.todos.create_index(['project_id', 'due'], if_not_exists=True)
@@ -1,12 +1,23 @@
 from fasthtml.common import *
 from monsterui.all import *
 
-app, rt = fast_app(hdrs=Theme.slate.headers())
+from db import db
+from assets import local_hdrs, serve_public
+from routing import compile_routes
+
+app, rt = fast_app(hdrs=local_hdrs(*def_hdrs(), *Theme.slate.headers()), default_hdrs=False)
+serve_public(app)
+# Per-route phase timings on `/metrics` with `METRICS=1`, from the `metrics.py` the layouts share
+if os.getenv('METRICS'):
+    sys.path.append(str(Path(__file__).parent.parent))
+    from metrics import phase_metrics
+    phase_metrics.install(app, db)
 
 from project_page import ar as project_ar
 from todo_page import ar as todo_ar
 
 project_ar.to_app(app)
 todo_ar.to_app(app)
+if os.getenv('COMPILED_ROUTES'): compile_routes(app)
 
 serve(port=5002)
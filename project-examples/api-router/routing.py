@@ -0,0 +1,78 @@
+"""Opt-in compiled route dispatch: with `COMPILED_ROUTES=1`, a request only tries the routes its path could match.
+
+Starlette's router tries every route's regex in turn until one matches, so routing costs more with every page added
+(see `benchmarks/route_dispatch.py`). `CompiledRoutes` indexes the routes by path instead: paths without parameters in a
+dict, paths with `{param}`s in a trie of path segments, where a parameter matches any one segment. Routes it can't
+index (mounts, `{...:path}` parameters, like fasthtml's static files route) are candidates for every path. The
+candidates are then tried with `route.matches`, in the order the routes were added, so the result is the same route
+with the same path params as the linear scan, 405s and slash redirects included."""
+from fasthtml.common import *
+from starlette.convertors import FloatConvertor, IntegerConvertor, StringConvertor, UUIDConvertor
+from starlette.datastructures import URL
+from starlette.routing import Match, get_route_path
+
+SEGMENT_CONVERTORS = StringConvertor, IntegerConvertor, FloatConvertor, UUIDConvertor  # never match a `/`; subclasses (like fasthtml's `static`) might
+_END = object()  # trie key of the routes whose path ends at a node
+
+def route_segments(route):
+    "`route`'s path split on `/`, with `None` for a segment with a parameter in it, or `None` if it can't be indexed"
+    if type(route) not in (Route, WebSocketRoute): return None
+    if not all(type(c) in SEGMENT_CONVERTORS for c in route.param_convertors.values()): return None
+    return [None if '{' in seg else seg for seg in route.path.split('/')]
+
+class CompiledRoutes:
+    "The routes of a `Router`, indexed by path, and an ASGI app dispatching to them like `Router.app`"
+    def __init__(self, router):
+        self.router,self.routes = router,None
+        self.build()
+
+    def build(self):
+        self.routes,self.n = self.router.routes,len(self.router.routes)
+        self.static,self.trie,self.always = {},{},[]
+        for i,route in enumerate(self.routes):
+            if (segs:=route_segments(route)) is None: self.always.append(i)
+            elif None not in segs: self.static.setdefault(route.path, []).append(i)
+            else:
+                node = self.trie
+                for seg in segs: node = node.setdefault(seg, {})
+                node.setdefault(_END, []).append(i)
+
+    def candidates(self, path):
+        "Indices of the routes that might match `path`, in order"
+        nodes = [self.trie]
+        for seg in path.split('/'):
+            nodes = [o for node in nodes for o in (node.get(seg), node.get(None)) if o is not None]
+            if not nodes: break
+        res = [*self.static.get(path, ()), *self.always, *(i for node in nodes for i in node.get(_END, ()))]
+        return sorted(res) if len(res) > 1 else res
+
+    def find(self, scope):
+        "`(route, child_scope)` of the route `Router.app` would dispatch `scope` to, or `(None, None)`"
+        if self.router.routes is not self.routes or len(self.routes) != self.n: self.build()  # routes added since
+        partial = None,None
+        for i in self.candidates(get_route_path(scope)):
+            match,child_scope = self.routes[i].matches(scope)
+            if match == Match.FULL: return self.routes[i],child_scope
+            if match == Match.PARTIAL and partial[0] is None: partial = self.routes[i],child_scope
+        return partial
+
+    async def __call__(self, scope, receive, send):
+        if 'router' not in scope: scope['router'] = self.router
+        if scope['type'] == 'lifespan': return await self.router.lifespan(scope, receive, send)
+        route,child_scope = self.find(scope)
+        if route is not None:
+            scope.update(child_scope)
+            return await route.handle(scope, receive, send)
+        route_path = get_route_path(scope)
+        if scope['type'] == 'http' and self.router.redirect_slashes and route_path != '/':
+            redirect_scope = dict(scope)
+            if route_path.endswith('/'): redirect_scope['path'] = redirect_scope['path'].rstrip('/')
+            else: redirect_scope['path'] = redirect_scope['path'] + '/'
+            if any(self.routes[i].matches(redirect_scope)[0] != Match.NONE for i in self.candidates(get_route_path(redirect_scope))):
+                return await RedirectResponse(url=str(URL(scope=redirect_scope)))(scope, receive, send)
+        await self.router.default(scope, receive, send)
+
+def compile_routes(app):
+    "Dispatch `app`'s requests through `CompiledRoutes`, built now from the routes added so far"
+    app.router.middleware_stack = CompiledRoutes(app.router)
+    return app.router.middleware_stack
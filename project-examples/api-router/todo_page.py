@@ -22,7 +22,39 @@ def TodoCard(todo:Todo):
                             delete),
                 id=tid(todo.id))
 
-def mk_todo_list(project_id):  return Grid(*(map(TodoCard,db.todos(where=f'project_id={project_id}', order_by='due'))), cols=1)
+def todos_for_project(project_id, after=None, limit=None):
+    "Todos of a project in `(due, id)` order, after the `(due, id)` key `after` if given; the index serves both"
+    if after is None: return db.todos(where='project_id=?', where_args=[project_id], order_by='due, id', limit=limit)
+    return db.todos(where='project_id=? and (due,id)>(?,?)', where_args=[project_id, *after], order_by='due, id', limit=limit)
+
+def next_todo(todo): return first(todos_for_project(todo.project_id, (todo.due, todo.id), 1))
+
+def toggle_todo(id):
+    "Flip `done` in one atomic statement, so concurrent toggles can't lose updates"
+    if row:=first(db.q(f'update {db.todos} set done = not done where id=? returning *', [id])): return Todo(**row)
+    raise NotFoundError()
+
+PAGE_SIZE = 50
+
+def mk_todo_page(project_id, due=None, id=None, page_size=PAGE_SIZE):
+    "One keyset page of todos after `(due, id)`, ending in a sentinel that fetches the next page when revealed"
+    todos = todos_for_project(project_id, None if due is None else (due,id), page_size+1)
+    cards = list(map(TodoCard, todos[:page_size]))
+    if len(todos) > page_size:
+        last = todos[page_size-1]
+        cards.append(Div(hx_get=more_todos.to(project_id=project_id, due=last.due, id=last.id),
+                         hx_trigger='revealed', hx_swap='outerHTML'))
+    else: cards.append(Div(id='todo-list-end'))
+    return cards
+
+def mk_todo_list(project_id):  return Grid(*mk_todo_page(project_id), cols=1)
+
+def mk_todo_swap(todo, old=None):
+    "OOB swaps that put a saved todo's card in its `(due, id)` position without re-rendering the list"
+    if old and old.due==todo.due: return TodoCard(todo)(hx_swap_oob='true'),
+    nxt = next_todo(todo)
+    card = Div(TodoCard(todo), hx_swap_oob=f"beforebegin:#{tid(nxt.id) if nxt else 'todo-list-end'}")
+    return (Div(id=tid(todo.id), hx_swap_oob='delete'), card) if old else (card,)
 
 @ar.delete
 async def delete_todo(id:int):
@@ -42,15 +74,23 @@ async def project_todos(project_id: int):
         Div(mk_todo_list(project_id), id='todo-list')
     )
 
+@ar.get
+async def more_todos(project_id:int, due:str, id:int):
+    "Next page of todos, swapped in place of the sentinel that requested it"
+    return tuple(mk_todo_page(project_id, due, id))
+
 @ar.post 
 async def upsert_todo(todo:Todo):
-    if todo.title.strip(): db.todos.insert(todo,replace=True)
-    return mk_todo_list(todo.project_id),mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    "Saves the todo and returns only its card, swapped into place out of band, plus a fresh form"
+    form = mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    if not todo.title.strip(): return form
+    old = db.todos.get(todo.id, default=None) if todo.id else None
+    return *mk_todo_swap(db.todos.insert(todo,replace=True), old), form
 
 @ar.get 
 async def toggle_done(id:int):
     "Reverses done boolean in the database and returns the todo (rendered with __ft__)"
-    return TodoCard(db.todos.update(Todo(id=id, done=not db.todos[id].done)))
+    return TodoCard(toggle_todo(id))
 
 def mk_todo_form(project_id, todo=None, btn_text="Add"):
     """Create a form for todo creation/editing with optional pre-filled values"""
@@ -66,10 +106,10 @@ def mk_todo_form(project_id, todo=None, btn_text="Add"):
         
     return Form(DivLAligned(
         *inputs,
-        Button(btn_text, cls=ButtonT.primary, post=upsert_todo,hx_target='#todo-list', hx_swap='innerHTML')),
+        Button(btn_text, cls=ButtonT.primary, post=upsert_todo, hx_swap='none')),
         id='todo-input', cls='mb-6')
 
 @ar.get 
 async def edit_todo(id:int): 
     todo = db.todos[id]
-    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"))
\ No newline at end of file
+    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"), id=tid(id))
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Load test for the python-modules db pool: latency of an unrelated route while a heavy query runs.
+
+Seeds a throwaway `todos.db`, then hits `/project/1` from `--clients` concurrent clients while one client
+loops on a slow query, once with no heavy load, once with the query run inline on the event loop (how every
+handler used to call the db) and once through `in_db`. The inline run's tail latency tracks the heavy
+query's duration; the pooled run's should stay close to the idle one.
+
+    python async_db.py --seconds 5 --heavy-rows 3000000
+"""
+import argparse, asyncio, os, statistics, sys, tempfile, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+import httpx
+import main as todo_app
+from db import cur_db, in_db
+
+def heavy(n): return cur_db().q('with recursive c(x) as (select 1 union all select x+1 from c where x<?) select count(*) n from c', (n,))
+
+@todo_app.rt
+async def heavy_inline(n:int): return str(heavy(n))
+@todo_app.rt
+async def heavy_pooled(n:int): return str(await in_db(heavy, n))
+
+def seed(c, todos=50):
+    c.post('/create_project', data={'name': 'bench'})
+    for i in range(todos): c.post('/upsert_todo', data=dict(title=f'todo {i}', done='', due='2030-01-01', project_id=1))
+
+async def run(mode, seconds, clients, rows):
+    lat,stop = [],time.perf_counter()+seconds
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(todo_app.app), base_url='http://test') as c:
+        async def light():
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                (await c.get('/project/1')).raise_for_status()
+                lat.append(time.perf_counter()-start)
+        async def heavy_loop():
+            while time.perf_counter() < stop: (await c.get(f'/heavy_{mode}', params=dict(n=rows))).raise_for_status()
+        await asyncio.gather(*(light() for _ in range(clients)), *([heavy_loop()] if mode!='idle' else []))
+    q = statistics.quantiles(lat, n=100)
+    print(f'{mode:>7}: {len(lat)/seconds:7.1f} req/s  p50 {q[49]*1e3:7.1f} ms  p99 {q[98]*1e3:7.1f} ms  max {max(lat)*1e3:7.1f} ms')
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--clients', type=int, default=8)
+    p.add_argument('--heavy-rows', type=int, default=3_000_000, help='rows counted by the heavy query')
+    args = p.parse_args()
+
+    seed(todo_app.Client(todo_app.app))
+    start = time.perf_counter(); heavy(args.heavy_rows)
+    print(f'heavy query alone: {(time.perf_counter()-start)*1e3:.0f} ms')
+    for mode in ('idle', 'inline', 'pooled'): asyncio.run(run(mode, args.seconds, args.clients, args.heavy_rows))
+
+if __name__ == '__main__': main()
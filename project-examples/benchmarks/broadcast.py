@@ -0,0 +1,58 @@
+"""Fan-out cost of the python-modules `Broadcast` used for the per-project todo event streams.
+
+Subscribes `--subscribers` consumers to one project, `--slow` of which take `--slow-ms` per message, then
+publishes `--messages` real `TodoCard` OOB swaps `--interval-ms` apart. Reports the cost of each `publish`,
+the delivery latency of fast consumers, and how many slow consumers were sent a `resync` instead of their backlog.
+
+    python broadcast.py --subscribers 5000 --slow 50
+"""
+import argparse, asyncio, os, statistics, sys, tempfile, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+from events import Broadcast, RESYNC
+from pages import mk_todo_swap
+from db import Todo
+
+async def consume(stream, n, delay, sent, lat, resyncs):
+    got = 0
+    async for chunk in stream:
+        if chunk==RESYNC: resyncs.append(1); return
+        if chunk.startswith('event: message'):
+            if not delay: lat.append(time.perf_counter()-sent[-1])
+            got += chunk.count('event: message')
+            if got >= n: return
+            if delay: await asyncio.sleep(delay)
+
+async def run(args):
+    b,sent,lat,resyncs = Broadcast(max_queue=args.max_queue),[],[],[]
+    streams = [b.stream(1) for _ in range(args.subscribers)]
+    for s in streams: await anext(s)  # the `retry` preamble, which also subscribes
+    tasks = [asyncio.create_task(consume(s, args.messages, args.slow_ms/1000 if i < args.slow else 0, sent, lat, resyncs))
+             for i,s in enumerate(streams)]
+    cost = []
+    for i in range(args.messages):
+        todo = Todo(id=i, title=f'todo {i}', done=i%2, due='2030-01-01', project_id=1)
+        sent.append(time.perf_counter())
+        b.publish(1, *mk_todo_swap(todo))
+        cost.append(time.perf_counter()-sent[-1])
+        await asyncio.sleep(args.interval_ms/1000)
+    await asyncio.wait(tasks, timeout=5)
+    for t in tasks: t.cancel()
+    q = statistics.quantiles(lat, n=100)
+    print(f'{args.subscribers} subscribers, {args.messages} messages')
+    print(f'publish: {statistics.mean(cost)*1e3:.2f} ms mean, {statistics.mean(cost)/args.subscribers*1e6:.2f} µs per subscriber')
+    print(f'delivery to fast consumers: p50 {q[49]*1e3:.1f} ms  p99 {q[98]*1e3:.1f} ms')
+    print(f'slow consumers resynced: {len(resyncs)} of {args.slow}')
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--subscribers', type=int, default=5000)
+    p.add_argument('--slow', type=int, default=50)
+    p.add_argument('--slow-ms', type=float, default=5000)
+    p.add_argument('--messages', type=int, default=200)
+    p.add_argument('--interval-ms', type=float, default=10)
+    p.add_argument('--max-queue', type=int, default=64)
+    asyncio.run(run(p.parse_args()))
+
+if __name__ == '__main__': main()
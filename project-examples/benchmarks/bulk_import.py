@@ -0,0 +1,65 @@
+"""Throughput of importing todos into python-modules a chunk per transaction, vs saving them one at a time.
+
+Builds a CSV of `--todos` todos (100k by default) and imports it into a throwaway db three ways:
+
+- `import_todos`: the db call on its own, one transaction and statement per `IMPORT_CHUNK` rows
+- `/import_todos`: the whole route driven through the ASGI app, from the upload through parsing to the final re-render
+- `save_todo`: one upsert and commit per todo, the way the form adds them, timed on `--sample` todos and extrapolated
+
+It also times a single `toggle_todo` sent while an import runs, which only waits for the chunk being written.
+
+    python bulk_import.py --todos 100000
+"""
+import apsw, argparse, asyncio, os, sys, tempfile, threading, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+from fasthtml.common import Client
+import main as todo_app
+import db
+from bulk import parse_todos
+
+def mk_csv(n): return ('title,done,due\n' + ''.join(f'imported todo {i},{"x" if i%3==0 else ""},2030-{i%12+1:02d}-{i%28+1:02d}\n'
+                                                     for i in range(n))).encode()
+
+def report(label, n, took): print(f'{label:>14}: {n:>9,} todos {took:8.2f} s {n/took:>11,.0f} todos/s')
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--todos', type=int, default=100_000)
+    p.add_argument('--sample', type=int, default=2000)
+    args = p.parse_args()
+    client = Client(todo_app.app)
+    for i in range(3): client.post('/create_project', data={'name': f'project {i}'})
+    data = mk_csv(args.todos)
+
+    start = time.perf_counter()
+    rows = parse_todos('todos.csv', data)
+    print(f'parsed {len(data)/2**20:.1f} MiB of CSV in {time.perf_counter()-start:.2f} s')
+    start = time.perf_counter()
+    db.import_todos(1, rows)
+    report('import_todos', args.todos, time.perf_counter()-start)
+
+    start = time.perf_counter()
+    r = client.post('/import_todos?project_id=2', files={'file': ('todos.csv', data)}, headers={'HX-Request': 'true'})
+    took = time.perf_counter()-start  # the import runs as the response's background task, so it's done here
+    assert r.status_code==200 and db.project_rows()[1].total==args.todos, r.text
+    report('/import_todos', args.todos, took)
+
+    start = time.perf_counter()
+    for title,done,due in rows[:args.sample]: db.save_todo(db.Todo(title=title, done=done, due=due, project_id=3))
+    took = time.perf_counter()-start
+    report('save_todo', args.sample, took)
+    print(f'{"":>14}  ~{took*args.todos/args.sample:.1f} s for {args.todos:,} todos')
+
+    # A toggle from another connection while an import runs
+    t = threading.Thread(target=db.import_todos, args=(1, rows))
+    t.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    try: asyncio.run(db.in_db(db.toggle_todo, 1)); res = 'waited'  # on a pool connection
+    except apsw.BusyError: res = 'gave up after'
+    print(f'toggle during import {res} {time.perf_counter()-start:.2f} s (busy timeout {db.BUSY_TIMEOUT_MS/1000:.0f} s)')
+    t.join()
+
+if __name__ == '__main__': main()
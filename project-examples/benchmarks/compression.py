@@ -0,0 +1,48 @@
+"""Bandwidth vs CPU of the python-modules response compression.
+
+Renders real responses from a seeded throwaway db (the projects index, a full project page and an htmx card swap),
+then compresses each with plain gzip, with gzip splicing in the precompressed invariant blocks (`DeflateBlocks`,
+warm) and, if installed, brotli at the middleware's quality and at max quality.
+
+    python compression.py --projects 20 --todos 50
+"""
+import argparse, gzip, os, sys, tempfile, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+import main as todo_app
+from compression import DeflateBlocks, brotli
+
+def timeit(f, body, min_time=0.2):
+    "Best wall time of `f(body)` over as many runs as fit in `min_time`, and its output"
+    best,spent = float('inf'),0.
+    while spent < min_time:
+        start = time.perf_counter()
+        res = f(body)
+        t = time.perf_counter()-start
+        best,spent = min(best, t),spent+t
+    return best, res
+
+def responses(projects, todos):
+    c,h = todo_app.Client(todo_app.app),{'HX-Request': 'true'}  # `.content` is decoded whatever the encoding
+    for i in range(projects): c.post('/create_project', data={'name': f'project {i}'}, headers=h)
+    for i in range(todos): c.post('/upsert_todo', data=dict(title=f'todo {i}', done='', due='2030-01-01', project_id=1), headers=h)
+    return {'index': c.get('/').content, 'project page': c.get('/project/1').content,
+            'htmx card swap': c.get('/toggle_done', params={'id': 1}, headers=h).content}
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--projects', type=int, default=20)
+    p.add_argument('--todos', type=int, default=50)
+    args = p.parse_args()
+    blocks = DeflateBlocks()
+    codecs = {'gzip -6': lambda b: gzip.compress(b, 6, mtime=0), 'gzip -6 spliced': blocks.gzip}
+    if brotli: codecs |= {'br q4': lambda b: brotli.compress(b, quality=4), 'br q11': lambda b: brotli.compress(b, quality=11)}
+    else: print('brotli not installed, skipping br')
+    for name,body in responses(args.projects, args.todos).items():
+        print(f'{name}: {len(body):,} bytes')
+        for codec,f in codecs.items():
+            t,out = timeit(f, body)
+            print(f'  {codec:>16}: {len(out):8,} bytes ({len(out)/len(body):6.1%})  {t*1e6:8.1f} µs')
+
+if __name__ == '__main__': main()
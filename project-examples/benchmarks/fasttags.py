@@ -0,0 +1,104 @@
+"""Micro-benchmarks for the FastTag list-building patterns in `fasttags_patterns.py` and the python-modules components.
+
+Each case builds an FT tree of `n` items and serializes it with `to_xml`. Time is the best of several runs;
+peak allocation comes from a separate `tracemalloc` run so it doesn't skew the timings.
+
+    python fasttags.py --save             # record fasttags_baseline.json
+    python fasttags.py --threshold 0.2    # exit 1 if any case got >20% slower or hungrier than the baseline
+    python fasttags.py --sizes 10 1000 100000   # add the large case (about a minute for the FT `TodoCard` alone)
+
+Timings depend on the machine, so the baseline is a local file, not committed: record one on the machine (and
+at the sizes) you compare on, before the change being measured.
+"""
+import argparse, json, sys, time, tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+from fasthtml.common import *
+from components.cards import TodoCard, ProjectCard
+from components.forms import mk_todo_form, mk_project_form
+
+def for_loop(n):
+    li_elements = []
+    for todo in range(n):
+        if todo: li_elements.append(Li(f'todo {todo}'))
+    return Ul(*li_elements, cls='list-disc')
+
+def list_comprehension(n): return Ul(*[Li(f'todo {todo}') for todo in range(n) if todo], cls='list-disc')
+
+def PersonCard(person): return Div(Strong(person['name']), P(f"Age: {person['age']}"), cls='border border-solid max-w-28')
+def map_function(n): return Div(*map(PersonCard, ({'name': f'Person {i}', 'age': i%90} for i in range(n))), cls='space-y-3')
+
+def conditional_inclusion(n):
+    def form(show_email):
+        form_fields = [Label("Name:"), Input(name="name", placeholder="Enter name", cls='border'), Br()]
+        if show_email: form_fields.extend([Label("Email:"), Input(name="email", type="email", placeholder="Enter email", cls='border')])
+        return Form(*form_fields)
+    return Div(*(form(i%2) for i in range(n)))
+
+def status_badge(status):
+    match status:
+        case "active":   return Span("Active",   style="color: green;")
+        case "pending":  return Span("Pending",  style="color: orange;")
+        case "inactive": return Span("Inactive", style="color: red;")
+        case _:          return Span("Unknown",  style="color: gray;")
+def pattern_matching(n): return Div(*[status_badge(s) for s in ("active", "pending", "inactive", "other")*(n//4)], cls='space-x-10')
+
+def _todos(n):
+    today = date.today()
+    return (((today+timedelta(days=i%60-30)).isoformat(), i%3==0, f'todo {i}', i) for i in range(n))
+def todo_card(n):    return Div(*(TodoCard(*o) for o in _todos(n)))
+def todo_card_ft(n): return Div(*(TodoCard.__wrapped__(*o) for o in _todos(n)))
+def project_card(n): return Div(*(ProjectCard(f'project {i}', datetime(2025, 1, 1+i%28), i) for i in range(n)))
+def todo_form(n):    return Div(*(mk_todo_form(i) for i in range(n)))
+def project_form(n): return Div(*(mk_project_form() for _ in range(n)))
+
+cases = [for_loop, list_comprehension, map_function, conditional_inclusion, pattern_matching,
+         todo_card, todo_card_ft, project_card, todo_form, project_form]
+
+def timeit(f, n, min_time=0.2):
+    "Best wall time of `to_xml(f(n))` over as many runs as fit in `min_time` (at least one)"
+    best,spent = float('inf'),0.
+    while spent < min_time:
+        start = time.perf_counter()
+        to_xml(f(n))
+        t = time.perf_counter()-start
+        best,spent = min(best, t),spent+t
+    return best
+
+def peak_alloc(f, n):
+    tracemalloc.start()
+    to_xml(f(n))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def run(sizes):
+    res = {}
+    for f in cases:
+        for n in sizes:
+            res[f'{f.__name__}[{n}]'] = r = dict(seconds=timeit(f, n), peak_bytes=peak_alloc(f, n))
+            print(f'{f.__name__+f"[{n}]":>28}: {r["seconds"]*1e3:10.2f} ms  {r["seconds"]/n*1e6:8.1f} µs/item  '
+                  f'{r["peak_bytes"]/2**20:8.2f} MiB peak')
+    return res
+
+def regressions(res, base, threshold):
+    for k,r in res.items():
+        if k not in base: continue
+        for m in ('seconds', 'peak_bytes'):
+            if r[m] > base[k][m]*(1+threshold): yield f'{k} {m}: {base[k][m]:.4g} -> {r[m]:.4g}'
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--sizes', type=int, nargs='+', default=[10, 1_000])
+    p.add_argument('--baseline', type=Path, default=Path(__file__).parent/'fasttags_baseline.json')
+    p.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    p.add_argument('--threshold', type=float, default=0.2, help='allowed fractional regression')
+    args = p.parse_args()
+    res = run(args.sizes)
+    if args.save: return args.baseline.write_text(json.dumps(res, indent=2))
+    if not args.baseline.exists(): return print(f'No baseline at {args.baseline}; run with --save to record one')
+    if bad:=list(regressions(res, json.loads(args.baseline.read_text()), args.threshold)):
+        sys.exit('Regressions past threshold:\n  '+'\n  '.join(bad))
+
+if __name__ == '__main__': main()
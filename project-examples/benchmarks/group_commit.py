@@ -0,0 +1,40 @@
+"""Write throughput of python-modules `save_todo` with and without the `GroupCommit` write coalescer.
+
+`--clients` concurrent tasks insert todos for `--seconds` each way: one commit per write on the `in_db`
+pool, then batched through `GroupCommit(window, max_batch)`. Use `--synchronous full` to pay for an fsync
+per commit, which is where group commit pays off most.
+
+    python group_commit.py --clients 64 --synchronous full --window-ms 2 --batch 64
+"""
+import argparse, asyncio, os, statistics, sys, tempfile, time
+from pathlib import Path
+
+async def load(write, seconds, clients):
+    from db import Todo, save_todo
+    lat,stop = [],time.perf_counter()+seconds
+    async def client(i):
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await write(save_todo, Todo(title=f'todo {i}', done=False, due='2030-01-01', project_id=1))
+            lat.append(time.perf_counter()-start)
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    return lat
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--clients', type=int, default=64)
+    p.add_argument('--synchronous', default='full', choices=['off', 'normal', 'full'])
+    p.add_argument('--window-ms', type=float, default=2)
+    p.add_argument('--batch', type=int, default=64)
+    args = p.parse_args()
+    os.environ['DB_SYNCHRONOUS'] = args.synchronous
+    sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+    os.chdir(tempfile.mkdtemp())
+    from db import GroupCommit, in_db
+    for name,write in (('per-write commit', in_db), ('group commit', GroupCommit(args.window_ms/1000, args.batch))):
+        lat = asyncio.run(load(write, args.seconds, args.clients))
+        q = statistics.quantiles(lat, n=100)
+        print(f'{name:>16}: {len(lat)/args.seconds:8.0f} writes/s  p50 {q[49]*1e3:6.1f} ms  p99 {q[98]*1e3:6.1f} ms')
+
+if __name__ == '__main__': main()
@@ -0,0 +1,166 @@
+"""HTTP load test of the four example layouts: a weighted mix of htmx traffic, latency per route and worker count.
+
+For each layout, copies it to a fresh directory, has it create `todos.db`, seeds `--projects` projects with
+`--todos` todos each straight into the file, then serves it with `uvicorn main:app --workers N` for each
+`--workers` count (on a fresh copy of the seeded db each time). `--clients` simulated users then send requests
+back to back for `--seconds`, after `--warmup` seconds that aren't counted, each picking its next request from
+`--mix`:
+
+- `index` and `project_todos`: full page loads, with the `If-None-Match` of the user's last copy of the page
+- `edit_todo`, `toggle_done`, `upsert_todo` (new todos and edits), `delete_todo`: htmx requests, with the
+  `HX-Request`, `HX-Current-URL`, `HX-Target` and `HX-Trigger` headers htmx sends from the project page
+
+Todos are only toggled, edited or deleted while the harness believes they exist. Any status other than 2xx/304 is
+an error. The report has requests/s and p50/p99/p99.9 latency per route, and in total. The load generator shares
+the machine with the servers, so compare runs on the same machine only.
+
+    python load.py --layouts python-modules single-file --workers 1 2 4 --seconds 20
+"""
+import argparse, asyncio, os, random, shutil, socket, subprocess, sys, tempfile, time
+from collections import defaultdict
+from pathlib import Path
+import apsw, httpx
+
+root = Path(__file__).parent.parent
+layouts = ['single-file', 'api-router', 'global-app', 'python-modules']
+MIX = 'index=15,project_todos=40,edit_todo=10,toggle_done=15,upsert_todo=15,delete_todo=5'
+BROWSER = {'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8', 'Accept-Encoding': 'gzip, br',
+           'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) load.py'}
+
+def free_port():
+    with socket.socket() as s: s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def seeded(layout, projects, todos):
+    "A copy of `layout` with a `todos.db` created by the app itself, then filled"
+    d = Path(tempfile.mkdtemp())/layout
+    shutil.copytree(root/layout, d, ignore=shutil.ignore_patterns('__pycache__', 'todos.db*'))
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=d, check=True, stdout=subprocess.DEVNULL)
+    db,rng = apsw.Connection(str(d/'todos.db')),random.Random(0)
+    with db:
+        db.executemany('insert into project (name, created) values (?, ?)', ((f'project {i}', '2030-01-01T00:00:00') for i in range(projects)))
+        db.executemany('insert into todo (title, done, due, project_id) values (?, ?, ?, ?)',
+                       ((f'todo {j} of project {i}', rng.random() < .3, f'20{rng.randint(24, 31)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', i)
+                        for i in range(1, projects+1) for j in range(todos)))
+    db.execute('pragma wal_checkpoint(truncate)')
+    db.close()
+    return d
+
+def start(d, workers, port):
+    p = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--workers', str(workers),
+                          '--log-level', 'warning'], cwd=d)
+    for _ in range(600):
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/').status_code==200: return p
+        except httpx.TransportError: time.sleep(.1)
+        if p.poll() is not None: break
+    p.kill(); raise RuntimeError(f'{d.name} did not start')
+
+class User:
+    "One simulated user: a project page open in a browser, and the ETags of the pages it has seen"
+    def __init__(self, c, rng, todos, projects):
+        self.c,self.rng,self.todos,self.projects,self.etags = c,rng,todos,projects,{}
+        self.project = rng.randint(1, projects)
+
+    def htmx(self, target, trigger):
+        return {'HX-Request': 'true', 'HX-Current-URL': f'{self.c.base_url}project/{self.project}', 'HX-Target': target, 'HX-Trigger': trigger}
+
+    async def page(self, path):
+        r = await self.c.get(path, headers=BROWSER | ({'If-None-Match': self.etags[path]} if path in self.etags else {}))
+        if 'etag' in r.headers: self.etags[path] = r.headers['etag']
+        return r
+
+    def todo(self):
+        "A todo of this user's project that should still exist"
+        ids = self.todos[self.project]
+        return ids[self.rng.randrange(len(ids))] if ids else None
+
+    async def index(self): return await self.page('/')
+
+    async def project_todos(self):
+        self.project = self.rng.randint(1, self.projects)
+        return await self.page(f'/project/{self.project}')
+
+    async def edit_todo(self):
+        if (id:=self.todo()) is None: return
+        return await self.c.get(f'/edit_todo?id={id}', headers=self.htmx(f'todo-{id}', f'todo-{id}'))
+
+    async def toggle_done(self):
+        if (id:=self.todo()) is None: return
+        return await self.c.get(f'/toggle_done?id={id}', headers=self.htmx(f'todo-{id}', f'todo-{id}'))
+
+    async def upsert_todo(self):
+        form = dict(title=f'todo {self.rng.random():.6f}', done='', due=f'2030-{self.rng.randint(1, 12):02d}-01', project_id=self.project)
+        if self.rng.random() < .5 and (id:=self.todo()) is not None: form['id'] = id
+        return await self.c.post('/upsert_todo', data=form, headers=self.htmx('todo-input', 'todo-input'))
+
+    async def delete_todo(self):
+        ids = self.todos[self.project]
+        if not ids: return
+        id = ids.pop(self.rng.randrange(len(ids)))
+        return await self.c.delete(f'/delete_todo?id={id}', headers=self.htmx(f'todo-{id}', f'todo-{id}'))
+
+def percentile(xs, q): return xs[min(len(xs)-1, int(q*len(xs)))]
+
+async def load(url, args, todos):
+    mix = dict((k, float(v)) for k,v in (o.split('=') for o in args.mix.split(',')))
+    lat,errors = defaultdict(list),defaultdict(int)
+    start = time.perf_counter()
+    warm,stop = start+args.warmup,start+args.warmup+args.seconds
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as c:
+        async def user(i):
+            u = User(c, random.Random(i), todos, args.projects)
+            while (now:=time.perf_counter()) < stop:
+                route = u.rng.choices(list(mix), weights=list(mix.values()))[0]
+                try: r = await getattr(u, route)()
+                except httpx.HTTPError: r = None
+                else:
+                    if r is None: continue  # nothing left to act on
+                took = time.perf_counter()-now
+                if now < warm: continue
+                if r is not None and (200 <= r.status_code < 300 or r.status_code==304): lat[route].append(took)
+                else: errors[route] += 1
+        await asyncio.gather(*(user(i) for i in range(args.clients)))
+    return lat,errors
+
+def report(layout, workers, lat, errors, seconds):
+    rows = [(route, sorted(xs), errors[route]) for route,xs in sorted(lat.items())]
+    rows += [(route, [], n) for route,n in sorted(errors.items()) if route not in lat]
+    rows.append(('total', sorted(x for xs in lat.values() for x in xs), sum(errors.values())))
+    print(f'\n{layout}, {workers} worker{"s"*(workers>1)}')
+    print(f'{"route":>14} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"p99.9 ms":>9} {"errors":>7}')
+    for route,xs,n in rows:
+        q = [f'{percentile(xs, q)*1e3:8.1f}' for q in (.5, .99, .999)] if xs else ['       -']*3
+        print(f'{route:>14} {len(xs)/seconds:8.1f} {q[0]} {q[1]} {q[2]:>9} {n:7}')
+
+def run(layout, args):
+    base = seeded(layout, args.projects, args.todos)
+    for workers in args.workers:
+        d = Path(tempfile.mkdtemp())/layout
+        shutil.copytree(base, d)
+        port = free_port()
+        p = start(d, workers, port)
+        try:
+            db = apsw.Connection(str(d/'todos.db'))
+            todos = defaultdict(list)
+            for id,project_id in db.execute('select id, project_id from todo'): todos[project_id].append(id)
+            db.close()
+            lat,errors = asyncio.run(load(f'http://127.0.0.1:{port}', args, todos))
+        finally: p.terminate(); p.wait()
+        report(layout, workers, lat, errors, args.seconds)
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--layouts', nargs='+', default=layouts, choices=layouts)
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--projects', type=int, default=20)
+    p.add_argument('--todos', type=int, default=200, help='per project')
+    p.add_argument('--clients', type=int, default=32)
+    p.add_argument('--seconds', type=float, default=20)
+    p.add_argument('--warmup', type=float, default=3)
+    p.add_argument('--mix', default=MIX, help=f'weights of the routes, default {MIX}')
+    args = p.parse_args()
+    print(f'{os.cpu_count()} cpus, {args.clients} clients, {args.projects} projects x {args.todos} todos, mix {args.mix}')
+    for layout in args.layouts: run(layout, args)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,46 @@
+"""Equivalence check and benchmark for the `@precompiled` `TodoCard` in python-modules.
+
+First proves the compiled card is byte-identical to the FT path (`TodoCard.__wrapped__` + `to_xml`)
+for every generated row, including awkward titles, then times both over the same rows.
+
+    python precompiled_cards.py --rows 10000
+"""
+import argparse, random, sys, time
+from datetime import date, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+from fasthtml.common import *
+from components.cards import TodoCard
+
+titles = ['Buy milk', '', ' padded ', '<script>alert(1)</script>', 'Tom & Jerry', 'say "hi"', "it's",
+          '`back` \'n\' "forth"', 'ünïcödé ✓', '&amp; already escaped', 'a\nb', '{braces}', '%s %d']
+
+def rows(n, seed=0):
+    rng,today = random.Random(seed),date.today()
+    for id in range(1, n+1):
+        due = (today + timedelta(days=rng.randint(-60, 60))).isoformat()
+        yield due, rng.choice([0, 1, True, False]), rng.choice(titles)+(f' {id}' if rng.random()<.5 else ''), id, due < today.isoformat()
+
+def check(rows):
+    for row in rows:
+        fast,ft = TodoCard(*row), to_xml(TodoCard.__wrapped__(*row))
+        assert str(fast)==str(ft), f'{row!r}:\n{fast}\n!=\n{ft}'
+    return len(rows)
+
+def bench(f, rows):
+    start = time.perf_counter()
+    for row in rows: f(*row)
+    return (time.perf_counter()-start)/len(rows)*1e6
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--rows', type=int, default=10_000)
+    args = p.parse_args()
+    data = list(rows(args.rows))
+    print(f'{check(data):,} rows byte-identical')
+    ft = bench(lambda *o: to_xml(TodoCard.__wrapped__(*o)), data)
+    fast = bench(TodoCard, data)
+    print(f'FT tree + to_xml: {ft:7.1f} µs/card')
+    print(f'precompiled     : {fast:7.1f} µs/card  ({ft/fast:.1f}x)')
+
+if __name__ == '__main__': main()
@@ -0,0 +1,103 @@
+"""Routing overhead of an `APIRouter` app as it grows: Starlette's linear scan vs api-router's `CompiledRoutes`.
+
+For each `--routes` count, builds an app the way api-router does, with that many routes registered through
+`APIRouter`s and `to_app`: filler pages, half static (`/page_{i}`) and half with a parameter
+(`/page_{i}/{item_id}`), then `/project/{project_id}` and `/toggle_done` last, like pages added before them. It
+checks that both dispatchers pick the same route with the same path params for a set of requests (hits, 404s,
+405s, slash redirects, static files), then times for `/project/1` and `/toggle_done?id=1`:
+
+- `lookup`: finding the route alone, µs per request
+- `request`: the whole request through the app (middleware, handler returning a short string), µs per request
+
+    python route_dispatch.py --routes 10 100 1000
+"""
+import argparse, asyncio, os, sys, tempfile, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'api-router'))
+os.chdir(tempfile.mkdtemp())  # for the apps' `.sesskey`
+from fasthtml.common import *
+from starlette.routing import Match
+from routing import CompiledRoutes, compile_routes
+
+PATHS = [('GET', '/project/1'), ('GET', '/toggle_done', 'id=1'), ('POST', '/toggle_done'), ('DELETE', '/project/1'),
+         ('GET', '/project/1/'), ('GET', '/project/x'), ('GET', '/page_2'), ('GET', '/page_3/7'), ('GET', '/page_2/'),
+         ('GET', '/nope'), ('GET', '/'), ('GET', '/app.css'), ('GET', '/a/b/c.js'), ('GET', '/project')]
+
+def mk_app(n):
+    "An app with `n` routes from `APIRouter`s, the two timed ones added last"
+    app,rt = fast_app()
+    pages,todos = APIRouter(),APIRouter()
+    def item(item_id:int): return f'item {item_id}'
+    def page(): return 'page'
+    for i in range(n-2):
+        if i%2: pages(f'/page_{i}/{{item_id}}', name=f'item_{i}')(item)
+        else: pages(f'/page_{i}', name=f'page_{i}')(page)
+    @todos.get('/project/{project_id}')
+    def project(project_id:int): return f'project {project_id}'
+    @todos.get
+    def toggle_done(id:int): return f'toggled {id}'
+    pages.to_app(app)
+    todos.to_app(app)
+    return app
+
+def mk_scope(app, method, path, query=''):
+    return dict(type='http', http_version='1.1', method=method, scheme='http', path=path, raw_path=path.encode(),
+                query_string=query.encode(), root_path='', headers=[(b'host', b'bench')], client=('bench', 0),
+                server=('bench', 80), app=app)
+
+def scan(routes, scope):
+    "`(route, child_scope)` the way `Router.app` finds it: every route in turn until a full match"
+    partial = None,None
+    for route in routes:
+        match,child_scope = route.matches(scope)
+        if match == Match.FULL: return route,child_scope
+        if match == Match.PARTIAL and partial[0] is None: partial = route,child_scope
+    return partial
+
+async def request(app, scope):
+    "Status of one request sent straight to the ASGI app"
+    res = {}
+    async def receive(): return dict(type='http.request', body=b'', more_body=False)
+    async def send(msg):
+        if msg['type']=='http.response.start': res['status'] = msg['status']
+    await app(dict(scope), receive, send)
+    return res['status']
+
+def per_call(f, runs):
+    start = time.perf_counter()
+    for _ in range(runs): f()
+    return (time.perf_counter()-start)/runs*1e6
+
+async def per_request(app, scope, runs):
+    start = time.perf_counter()
+    for _ in range(runs): await request(app, scope)
+    return (time.perf_counter()-start)/runs*1e6
+
+async def run(args):
+    print(f'{"routes":>7} {"path":>20} {"scan µs":>9} {"compiled µs":>12} {"request µs":>11} {"compiled request µs":>20}')
+    for n in args.routes:
+        app = mk_app(n)
+        compiled = CompiledRoutes(app.router)
+        statuses = {}
+        for p in PATHS:
+            scope = mk_scope(app, *p)
+            assert scan(app.router.routes, scope) == compiled.find(scope), p
+            statuses[p] = await request(app, scope)
+        for label,p in ('/project/1', ('GET', '/project/1')),('/toggle_done?id=1', ('GET', '/toggle_done', 'id=1')):
+            scope = mk_scope(app, *p)
+            lookup = per_call(lambda: scan(app.router.routes, scope), args.runs), per_call(lambda: compiled.find(scope), args.runs)
+            req = await per_request(app, scope, args.runs//10)
+            compile_routes(app)
+            req = req,await per_request(app, scope, args.runs//10)
+            app.router.middleware_stack = app.router.app  # back to the linear scan
+            print(f'{n:>7} {label:>20} {lookup[0]:9.2f} {lookup[1]:12.2f} {req[0]:11.1f} {req[1]:20.1f}')
+        compile_routes(app)
+        assert all([await request(app, mk_scope(app, *p)) == statuses[p] for p in PATHS])
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--routes', type=int, nargs='+', default=[10, 100, 1000])
+    p.add_argument('--runs', type=int, default=20000)
+    asyncio.run(run(p.parse_args()))
+
+if __name__ == '__main__': main()
@@ -0,0 +1,62 @@
+"""Peak RSS of rendering every card of a big python-modules project, from full objects vs compact cursor rows.
+
+Seeds one project with `--todos` todos in a throwaway db, then renders all their `TodoCard`s in a fresh process per
+mode, reporting the growth of peak RSS over the process's RSS before the query, and the wall time (Linux only: the
+peak is read from `/proc` after resetting it, as imports alone peak far above what they leave resident):
+
+- `objects`: `todos_for_project`, a list with a `Todo` per row, built from a dict
+- `rows`: `todo_rows`, a list of compact `TodoRow`s
+- `iter rows`: `iter_todo_rows`, reading each row off the cursor only when the render pipeline wants the next card
+
+Each card is written out as soon as it's rendered, so the difference is all in how the rows are held.
+
+    python row_memory.py --todos 100000
+"""
+import argparse, os, subprocess, sys, tempfile, time
+from pathlib import Path
+
+MODES = 'objects','rows','iter rows'
+
+def status_kib(field):
+    "`field` of `/proc/self/status` (`VmRSS`, `VmHWM`, ...) in KiB"
+    with open('/proc/self/status') as f: return int(next(l for l in f if l.startswith(field+':')).split()[1])
+
+def render(mode):
+    from db import todos_for_project, todo_rows, iter_todo_rows
+    from components.cards import TodoCard
+    sink = open(os.devnull, 'w')
+    rows = {'objects': todos_for_project, 'rows': todo_rows, 'iter rows': iter_todo_rows}[mode](1)
+    for t in rows: sink.write(str(TodoCard(t.due, t.done, t.title, t.id)))
+
+def child(mode):
+    import db  # opens the seeded db in the cwd
+    from components.cards import TodoCard
+    TodoCard('2030-01-01', False, 'warm up', 0)
+    with open('/proc/self/clear_refs', 'w') as f: f.write('5')  # resets the peak to the current RSS
+    base,start = status_kib('VmRSS'),time.perf_counter()
+    render(mode)
+    took = time.perf_counter()-start
+    print(status_kib('VmHWM')-base, took)
+
+def seed(n):
+    from db import db, Project, Todo
+    db.projects.insert(Project(name='big', created='2030-01-01'))
+    db.todos.insert_all(Todo(title=f'todo number {i}', done=i%3==0, due=f'2030-{i%12+1:02d}-{i%28+1:02d}', project_id=1)
+                        for i in range(n))
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--todos', type=int, default=100_000)
+    p.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = p.parse_args()
+    sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+    if args.child: return child(args.child)
+    os.chdir(tempfile.mkdtemp())
+    seed(args.todos)
+    print(f'{args.todos:,} todos')
+    for mode in MODES:
+        out = subprocess.run([sys.executable, __file__, '--child', mode], stdout=subprocess.PIPE, text=True, check=True).stdout
+        kib,took = out.split()
+        print(f'{mode:>10}: peak RSS +{int(kib)/1024:7.1f} MiB  {float(took):6.2f} s')
+
+if __name__ == '__main__': main()
@@ -0,0 +1,74 @@
+"""Latency of searching todo titles in python-modules: `LIKE '%...%'` vs the FTS5 index vs the search cache.
+
+Seeds `--todos` todos (a million by default) spread over `--projects` projects into a throwaway db, with titles of
+3-5 words drawn from a made-up vocabulary, then times `--queries` searches scoped to one project for each prefix
+length, as typed into the active search box: a `LIKE` scan of the project's rows, `search_todo_rows` (FTS5), and
+`search_cache` once warm. Seeding a million rows through the triggers takes a minute or two.
+
+    python search.py --todos 1000000 --projects 10
+"""
+import argparse, asyncio, os, random, statistics, string, sys, tempfile, time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+from db import db, TodoRow, search_todo_rows
+from search import SearchCache, search_terms
+
+_like = f'select id, title, done, due from {db.todos} where project_id=? and title like ? order by due, id limit ?'
+def like_rows(project_id, terms, limit=20):
+    "The obvious alternative: every word as a `%substring%`, checked against each of the project's rows"
+    return [TodoRow(*o) for o in db.execute(_like.replace('title like ?', ' and '.join(['title like ?']*len(terms))),
+                                            (project_id, *(f'%{t}%' for t in terms), limit))]
+
+def seed(n, projects, rng):
+    vocab = list({''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20000)})
+    db.execute('begin')
+    db.conn.executemany(f'insert into {db.projects} (name, created) values (?, ?)', ((f'project {i}', '2030-01-01') for i in range(projects)))
+    db.conn.executemany(f'insert into {db.todos} (title, done, due, project_id) values (?, ?, ?, ?)',
+                        ((' '.join(rng.choices(vocab, k=rng.randint(3, 5))), i%3==0, f'2030-{i%12+1:02d}-{i%28+1:02d}', 1+i%projects)
+                         for i in range(n)))
+    db.execute('commit')
+    return vocab
+
+def timings(f, queries):
+    res = []
+    for q in queries:
+        start = time.perf_counter()
+        f(q)
+        res.append(time.perf_counter()-start)
+    return res
+
+async def run(args):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    vocab = seed(args.todos, args.projects, rng)
+    print(f'seeded {args.todos:,} todos in {args.projects} projects in {time.perf_counter()-start:.0f}s')
+    cache,loop = SearchCache(),asyncio.get_running_loop()
+    print(f'{"typed":>14} {"LIKE p50/p99 ms":>18} {"FTS5 p50/p99 ms":>18} {"cached p50/p99 ms":>18}')
+    # Searches start at `MIN_PREFIX` (2) characters
+    for label,n,word in ('2 chars', 2, False),('3 chars', 3, False),('5 chars', 5, False),('word + 2', 2, True):
+        queries = [rng.choice(vocab)[:n] for _ in range(args.queries)]
+        if word: queries = [f'{rng.choice(vocab)} {q}' for q in queries]  # a whole word and the start of another
+        queries = [search_terms(q) for q in queries]
+        res = {'like': timings(lambda t: like_rows(1, t), queries), 'fts': timings(lambda t: search_todo_rows(1, t), queries)}
+        for t in queries: await cache(1, t)
+        cached = []
+        for t in queries:
+            start = time.perf_counter()
+            await cache(1, t)
+            cached.append(time.perf_counter()-start)
+        res['cached'] = cached
+        cells = []
+        for k in ('like', 'fts', 'cached'):
+            q = statistics.quantiles(res[k], n=100)
+            cells.append(f'{q[49]*1e3:8.3f}/{q[98]*1e3:8.3f}')
+        print(f'{label:>14} {cells[0]:>18} {cells[1]:>18} {cells[2]:>18}')
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--todos', type=int, default=1_000_000)
+    p.add_argument('--projects', type=int, default=10)
+    p.add_argument('--queries', type=int, default=200)
+    asyncio.run(run(p.parse_args()))
+
+if __name__ == '__main__': main()
@@ -0,0 +1,61 @@
+"""Cold-start profile of the four example layouts: time to first response, and where import time goes.
+
+Each run copies the layout to a fresh directory (so `todos.db` is created from scratch), starts it under uvicorn
+and polls `/` until it answers. `--importtime` also prints where import time goes, from `python -X importtime`,
+grouped by top-level package.
+
+    python startup.py --runs 5 --importtime
+"""
+import argparse, re, shutil, socket, statistics, subprocess, sys, tempfile, time
+from collections import Counter
+from pathlib import Path
+import httpx
+
+root = Path(__file__).parent.parent
+layouts = ['single-file', 'api-router', 'global-app', 'python-modules']
+
+def copy(layout):
+    d = Path(tempfile.mkdtemp())/layout
+    shutil.copytree(root/layout, d, ignore=shutil.ignore_patterns('__pycache__', 'todos.db*'))
+    return d
+
+def free_port():
+    with socket.socket() as s: s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def first_response(layout):
+    "Seconds from spawning the server to the first successful `GET /`"
+    d,port = copy(layout),free_port()
+    start = time.perf_counter()
+    p = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+                         cwd=d)
+    try:
+        while True:
+            try:
+                if httpx.get(f'http://127.0.0.1:{port}/').status_code==200: return time.perf_counter()-start
+            except httpx.TransportError: time.sleep(.005)
+            if p.poll() is not None: raise RuntimeError(f'{layout} exited with {p.returncode}')
+    finally: p.terminate(); p.wait()
+
+def import_profile(layout, top):
+    "Self import time in ms per top-level package, from `-X importtime`"
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'], cwd=copy(layout),
+                         capture_output=True, text=True)
+    tot = Counter()
+    for line in res.stderr.splitlines():
+        if m:=re.match(r'import time:\s+(\d+) \|\s+\d+ \|\s*(\S+)', line): tot[m[2].partition('.')[0]] += int(m[1])/1000
+    return sum(tot.values()), tot.most_common(top)
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--layouts', nargs='+', default=layouts, choices=layouts)
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--importtime', action='store_true', help='also print the import time per package')
+    p.add_argument('--top', type=int, default=8)
+    args = p.parse_args()
+    for layout in args.layouts:
+        print(f'{layout:>15}: first response {statistics.median(first_response(layout) for _ in range(args.runs))*1e3:6.0f} ms')
+        if args.importtime:
+            total,top = import_profile(layout, args.top)
+            print(f'{"":>17}imports: {total:.0f} ms; ' + ', '.join(f'{k} {v:.0f}' for k,v in top))
+
+if __name__ == '__main__': main()
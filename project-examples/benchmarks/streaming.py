@@ -0,0 +1,71 @@
+"""Time to first byte, time to last byte and peak memory of the python-modules project page, buffered vs streamed.
+
+Seeds projects of growing size in a throwaway db and shows each on a single page (`PAGE_SIZE` is raised to the
+project's size, as if the list weren't paginated). `buffered` renders the page the way `project_todos` used to:
+one query for the rows, one FT tree, one string. `streamed` is the current route. Both run warm (cards cached),
+driven straight through the ASGI app so the timings exclude the network.
+
+    python streaming.py --sizes 100 1000 10000
+"""
+import argparse, asyncio, os, sys, tempfile, time, tracemalloc
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent/'python-modules'))
+os.chdir(tempfile.mkdtemp())
+import main as todo_app
+from db import db, in_db, get_project, Project, Todo
+
+@todo_app.rt('/buffered/{project_id}')
+async def buffered(project_id:int, page_size:int):
+    project = await in_db(get_project, project_id)
+    todos_list,next_url = await in_db(todo_app.todos_page, project_id, page_size=page_size)
+    return todo_app.ProjectTodosPage(project.name, project_id, *todo_app.mk_todo_page(todos_list, next_url))
+
+def seed(sizes):
+    for i,n in enumerate(sizes, 1):
+        db.projects.insert(Project(name=f'{n} todos', created='2030-01-01'))
+        db.todos.insert_all([Todo(title=f'todo {j}', done=j%3==0, due=f'2030-{j%12+1:02d}-{j%28+1:02d}', project_id=i)
+                             for j in range(n)])
+
+async def get(path, query=''):
+    "TTFB, total time and body size of one request, sent straight to the ASGI app"
+    scope = dict(type='http', http_version='1.1', method='GET', scheme='http', path=path, raw_path=path.encode(),
+                 query_string=query.encode(), root_path='', headers=[(b'host', b'bench')], client=('bench', 0), server=('bench', 80))
+    start,res,sent = time.perf_counter(),dict(first=None, size=0),[]
+    async def receive():
+        if sent: await asyncio.Event().wait()  # never disconnects; streamed responses listen for that until done
+        sent.append(1)
+        return dict(type='http.request', body=b'', more_body=False)
+    async def send(msg):
+        if msg['type']=='http.response.body' and msg.get('body'):
+            if res['first'] is None: res['first'] = time.perf_counter()-start
+            res['size'] += len(msg['body'])
+    await todo_app.app(scope, receive, send)
+    return res['first'], time.perf_counter()-start, res['size']
+
+async def measure(path, query, runs):
+    await get(path, query)  # warm the card cache
+    best = None
+    for _ in range(runs):
+        tracemalloc.start()
+        ttfb,total,size = await get(path, query)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if best is None or total < best[1]: best = ttfb,total,size,peak
+    return best
+
+async def run(args):
+    seed(args.sizes)
+    print(f'{"todos":>7} {"mode":>9} {"ttfb ms":>9} {"total ms":>9} {"bytes":>11} {"peak KiB":>9}')
+    for i,n in enumerate(args.sizes, 1):
+        todo_app.PAGE_SIZE = n
+        for mode,path,query in ('buffered', f'/buffered/{i}', f'page_size={n}'),('streamed', f'/project/{i}', ''):
+            ttfb,total,size,peak = await measure(path, query, args.runs)
+            print(f'{n:>7} {mode:>9} {ttfb*1e3:9.1f} {total*1e3:9.1f} {size:11,} {peak/1024:9.0f}')
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    p.add_argument('--runs', type=int, default=3)
+    asyncio.run(run(p.parse_args()))
+
+if __name__ == '__main__': main()
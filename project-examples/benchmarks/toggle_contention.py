@@ -0,0 +1,67 @@
+"""Contention benchmark for `toggle_done`: read-then-update versus one atomic `UPDATE ... RETURNING`.
+
+Each client thread opens its own connection (like separate workers would) and toggles random todos.
+Every toggle is counted, so a todo's final `done` must equal the parity of its toggle count;
+any mismatch is a lost update.
+
+    python toggle_contention.py --clients 16 --toggles 500 --todos 20
+"""
+import argparse, os, random, tempfile, threading, time
+from collections import Counter
+from datetime import date
+from fasthtml.common import *
+
+class Todo:
+    id: int
+    title: str
+    done: bool
+    due: date
+    project_id: int
+
+def connect(path):
+    db = database(path)
+    db.conn.setbusytimeout(10_000)
+    db.todos = db.create(Todo)
+    return db
+
+def read_then_update(db, id):
+    "The original route body: two round trips with nothing stopping another client writing in between"
+    return db.todos.update(Todo(id=id, done=not db.todos[id].done))
+
+def atomic(db, id):
+    return Todo(**db.q(f'update {db.todos} set done = not done where id=? returning *', (id,))[0])
+
+def run(toggle, path, clients, toggles, ntodos):
+    counts,lock = Counter(),threading.Lock()
+    def client(db, seed):
+        rng,mine = random.Random(seed),Counter()
+        for _ in range(toggles):
+            id = rng.randint(1, ntodos)
+            toggle(db, id)
+            mine[id] += 1
+        with lock: counts.update(mine)
+    # Connect up front: opening a connection runs `pragma optimize`, which doesn't honour the busy timeout
+    threads = [threading.Thread(target=client, args=(connect(path), i)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter()-start
+    db = connect(path)
+    lost = sum(bool(t.done) != bool(counts[t.id]%2) for t in db.todos())
+    return clients*toggles/elapsed, lost
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--clients', type=int, default=16)
+    p.add_argument('--toggles', type=int, default=500, help='toggles per client')
+    p.add_argument('--todos',   type=int, default=20, help='fewer todos means more contention')
+    args = p.parse_args()
+    for name,toggle in [('read_then_update', read_then_update), ('atomic', atomic)]:
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'todos.db')
+            connect(path).todos.insert_all([Todo(title=f'todo {i}', done=False, due=date.today(), project_id=1)
+                                            for i in range(args.todos)])
+            tps,lost = run(toggle, path, args.clients, args.toggles, args.todos)
+        print(f'{name:>16}: {tps:9,.0f} toggles/s  {lost:4} todos with lost updates')
+
+if __name__ == '__main__': main()
@@ -0,0 +1,70 @@
+"""Throughput of python-modules served by 1..N uvicorn workers sharing one `todos.db`.
+
+For each worker count, starts `uvicorn main:app --workers N` on a fresh db, seeds a project, then drives
+`--clients` concurrent connections for `--seconds`: mostly `GET /project/1`, plus a `--write-ratio` share
+of `upsert_todo` posts so the shared file sees write contention. Failed requests (e.g. `database is
+locked`) are counted, not retried. Scaling is bounded by the cores left over after this load generator.
+
+    python workers.py --workers 1 2 4 --seconds 10
+"""
+import argparse, asyncio, os, random, socket, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+import httpx
+
+app_dir = Path(__file__).parent.parent/'python-modules'
+
+def free_port():
+    with socket.socket() as s: s.bind(('127.0.0.1', 0)); return s.getsockname()[1]
+
+def start(workers, port, cwd):
+    p = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', str(app_dir), '--port', str(port),
+                          '--workers', str(workers), '--log-level', 'warning'], cwd=cwd)
+    for _ in range(300):
+        try: httpx.get(f'http://127.0.0.1:{port}/'); return p
+        except httpx.TransportError: time.sleep(.1)
+    p.kill(); raise RuntimeError('server did not start')
+
+async def load(url, seconds, clients, write_ratio, todos):
+    lat,errors,stop = [],0,time.perf_counter()+seconds
+    async with httpx.AsyncClient(base_url=url, headers={'HX-Request': 'true'}, timeout=30) as c:
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                if random.random() < write_ratio:
+                    r = await c.post('/upsert_todo', data=dict(id=random.randint(1, todos), title=f'edit {random.random()}',
+                                                               done='', due='2030-01-01', project_id=1))
+                else: r = await c.get('/project/1')
+                if r.status_code==200: lat.append(time.perf_counter()-start)
+                else: errors += 1
+        await asyncio.gather(*(client() for _ in range(clients)))
+    return lat, errors
+
+def run(workers, args):
+    port,cwd = free_port(),tempfile.mkdtemp()
+    p = start(workers, port, cwd)
+    try:
+        url = f'http://127.0.0.1:{port}'
+        httpx.post(url+'/create_project', data={'name': 'bench'})
+        for i in range(args.todos): httpx.post(url+'/upsert_todo', data=dict(title=f'todo {i}', done='', due='2030-01-01', project_id=1))
+        lat,errors = asyncio.run(load(url, args.seconds, args.clients, args.write_ratio, args.todos))
+    finally: p.terminate(); p.wait()
+    q = statistics.quantiles(lat, n=100)
+    return len(lat)/args.seconds, q[49], q[98], errors
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--seconds', type=float, default=10)
+    p.add_argument('--clients', type=int, default=32)
+    p.add_argument('--todos', type=int, default=50)
+    p.add_argument('--write-ratio', type=float, default=0.05)
+    args = p.parse_args()
+    print(f'{os.cpu_count()} cpus')
+    base = None
+    for n in args.workers:
+        rps,p50,p99,errors = run(n, args)
+        base = base or rps
+        print(f'{n:2} workers: {rps:7.1f} req/s ({rps/base:4.2f}x)  p50 {p50*1e3:6.1f} ms  p99 {p99*1e3:6.1f} ms  {errors} errors')
+
+if __name__ == '__main__': main()
@@ -13,8 +13,13 @@ def _():
 
 @app.cell
 def _(Div, Script, mo):
+    import json
+    # marimo serves `public/` next to the notebook, where `vendor_assets.py` puts its copy of the Tailwind script
+    _manifest = mo.notebook_dir()/"public"/"manifest.json"
+    _tailwind = "https://cdn.tailwindcss.com"
+    if _manifest.exists(): _tailwind = "public/" + json.loads(_manifest.read_text()).get(_tailwind, _tailwind)
     def show(*c):
-        return mo.Html(str(Div(Script(src="https://cdn.tailwindcss.com"),*c)))
+        return mo.Html(str(Div(Script(src=_tailwind),*c)))
     return (show,)
 
 
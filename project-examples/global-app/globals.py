@@ -1,8 +1,10 @@
 from fasthtml.common import *
 from monsterui.all import *
 from datetime import date,datetime
+from assets import local_hdrs, serve_public
 
-app, _ = fast_app(hdrs=Theme.slate.headers())
+app, _ = fast_app(hdrs=local_hdrs(*def_hdrs(), *Theme.slate.headers()), default_hdrs=False)
+serve_public(app)
 
 class Project:
     id: int
@@ -18,4 +20,11 @@ class Todo:
     
 db = database('todos.db')
 db.projects = db.create(Project)
-db.todos = db.create(Todo)
\ No newline at end of file
+db.todos = db.create(Todo)
+db.todos.create_index(['project_id', 'due'], if_not_exists=True)
+
+# Per-route phase timings on `/metrics` with `METRICS=1`, from the `metrics.py` the layouts share
+if os.getenv('METRICS'):
+    sys.path.append(str(Path(__file__).parent.parent))
+    from metrics import phase_metrics
+    phase_metrics.install(app, db)
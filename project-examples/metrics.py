@@ -0,0 +1,107 @@
+"""Per-route request phase timings on `/metrics`, in Prometheus text format, shared by all four layouts.
+
+Each layout installs it with `METRICS=1`. Statement timing (the `db` phase) also needs `METRICS_DB=1`: apsw calls
+back into Python for every statement then, which a bulk write feels."""
+from fasthtml.common import *
+from starlette.responses import PlainTextResponse
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+import apsw, os
+
+TRACE_DB = bool(os.getenv('METRICS_DB'))
+BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+_timings = ContextVar('timings', default=None)
+
+class Histogram:
+    def __init__(self): self.counts,self.sum,self.n = [0]*(len(BUCKETS)+1),0.,0
+    def observe(self, v):
+        self.counts[bisect_left(BUCKETS, v)] += 1
+        self.sum += v; self.n += 1
+
+class PhaseMetrics:
+    """Per-route histograms of request phases: `db` (time inside SQLite statements, with `TRACE_DB`), `build` (the
+    rest of the handler, i.e. building the FT tree), `serialize` (rendering it to HTML, up to the response's start), `stream`
+    (from there to its last body chunk, less the db time meanwhile: a streamed page renders its rows here) and
+    `total`, plus gauges of the numbers in any `stats()` dicts added with `add_stats`"""
+    def __init__(self): self.hists,self.paths,self.stats = defaultdict(Histogram),{},{}
+
+    def add_stats(self, name, stats):
+        "Serve the numbers in the dict `stats()` returns as `fasthtml_stat{source=name,stat=...}` gauges"
+        self.stats[name] = stats
+
+    def install(self, app, db):
+        "Time every request to `app` (and every statement on `db`, with `TRACE_DB`), and serve the histograms on `/metrics`"
+        self.app = app
+        app.before.append(self.before)
+        app.after.append(self.after)
+        app.add_middleware(self.middleware)
+        self.trace_db(db)
+        app.route('/metrics')(self.metrics)
+
+    def middleware(self, app):
+        async def _app(scope, receive, send):
+            if scope['type'] != 'http': return await app(scope, receive, send)
+            t = dict(start=perf_counter(), db=0.)
+            token = _timings.set(t)
+            async def _send(msg):
+                if msg['type']=='http.response.start': t['sent'] = perf_counter()
+                elif msg['type']=='http.response.body' and not msg.get('more_body'): t['done'] = perf_counter()
+                await send(msg)
+            try: await app(scope, receive, _send)
+            finally:
+                _timings.reset(token)
+                self.record(scope, t, perf_counter())
+        return _app
+
+    def before(self, req):
+        if t:=_timings.get(): t['handler'] = perf_counter()
+
+    def after(self, resp, req):
+        if t:=_timings.get(): t['handled'],t['handled_db'] = perf_counter(),t['db']
+
+    def trace_db(self, db):
+        "Add the run time of `db`'s statements to the `db` phase, with `TRACE_DB`"
+        if TRACE_DB: db.conn.trace_v2(apsw.SQLITE_TRACE_STMT|apsw.SQLITE_TRACE_PROFILE, self.trace())
+
+    def trace(self):
+        "apsw trace callback adding each statement's run time to the current request's `db` phase"
+        starts = {}
+        def _cb(ev):
+            if (t:=_timings.get()) is None: return
+            if ev['code']==apsw.SQLITE_TRACE_STMT: starts[ev['id']] = perf_counter()
+            elif (s:=starts.pop(ev['id'], None)) is not None: t['db'] += perf_counter()-s
+        return _cb
+
+    def route(self, scope):
+        ep = scope.get('endpoint')
+        if ep not in self.paths: self.paths.update({getattr(r, 'endpoint', None): r.path for r in self.app.routes})
+        return self.paths.get(ep, 'unmatched')
+
+    def record(self, scope, t, end):
+        route,obs = self.route(scope),dict(db=t['db'], total=end-t['start']) if TRACE_DB else dict(total=end-t['start'])
+        if 'handled' in t:
+            sent = t.get('sent', end)
+            obs |= dict(build=t['handled']-t['handler']-t['handled_db'], serialize=sent-t['handled'],
+                        stream=t.get('done', end)-sent-(t['db']-t['handled_db']))
+        for phase,v in obs.items(): self.hists[route,phase].observe(v)
+
+    def exposition(self):
+        "The histograms in Prometheus text format"
+        name = 'fasthtml_request_phase_seconds'
+        lines = [f'# HELP {name} Request time by route and phase', f'# TYPE {name} histogram']
+        for (route,phase),h in sorted(self.hists.items()):
+            lbl,cum = 'route="{}",phase="{}"'.format(route.replace('\\', '\\\\').replace('"', '\\"'), phase),0
+            for le,c in zip((*BUCKETS, '+Inf'), h.counts):
+                cum += c
+                lines.append(f'{name}_bucket{{{lbl},le="{le}"}} {cum}')
+            lines += [f'{name}_sum{{{lbl}}} {h.sum}', f'{name}_count{{{lbl}}} {h.n}']
+        if self.stats: lines += ['# HELP fasthtml_stat Cache and stream counters', '# TYPE fasthtml_stat gauge']
+        for src,stats in self.stats.items():
+            lines += [f'fasthtml_stat{{source="{src}",stat="{k}"}} {float(v)}' for k,v in stats().items() if isinstance(v, (int, float))]
+        return '\n'.join(lines)+'\n'
+
+    def metrics(self): return PlainTextResponse(self.exposition(), media_type='text/plain; version=0.0.4')
+
+phase_metrics = PhaseMetrics()
@@ -0,0 +1,37 @@
+from fasthtml.common import *
+from pathlib import Path
+import copy, json, mimetypes
+from compression import accepted
+
+# Filled in by `vendor_assets.py`; without it pages keep loading their assets from the CDN
+PUBLIC = Path(__file__).parent.parent/'public'
+manifest = json.loads((PUBLIC/'manifest.json').read_text()) if (PUBLIC/'manifest.json').exists() else {}
+vendored = set(manifest.values())
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def local_hdrs(*hdrs):
+    "`hdrs`, with the `src`/`href` of each vendored asset pointing at its local copy"
+    res = []
+    for h in hdrs:
+        k = 'src' if 'src' in h.attrs else 'href'
+        if name:=manifest.get(h.attrs.get(k)):
+            h = copy.copy(h)  # the fasthtml and theme headers are shared, so never edited in place
+            h.attrs = {**h.attrs, k: f'/public/{name}'}
+        res.append(h)
+    return res
+
+async def public(req):
+    "A vendored asset, precompressed when the client takes that. Its name changes with its content, so it's cached for good"
+    fname = req.path_params['fname']
+    if fname not in vendored: return Response('Not found', 404)
+    hdrs,acc = {'Cache-Control': IMMUTABLE, 'Vary': 'Accept-Encoding'},accepted(req.headers.get('accept-encoding', ''))
+    q = lambda coding: acc.get(coding, acc.get('*', 0))
+    # Highest q-value first; `sorted` is stable, so brotli wins a tie
+    for coding,suffix in sorted((('br','.br'),('gzip','.gz')), key=lambda o: -q(o[0])):
+        if q(coding) > 0 and (path:=PUBLIC/(fname+suffix)).exists():
+            return FileResponse(path, headers=hdrs|{'Content-Encoding': coding}, media_type=mimetypes.guess_type(fname)[0])
+    return FileResponse(PUBLIC/fname, headers=hdrs)
+
+def serve_public(app):
+    "Route `/public/{fname}` to the vendored assets, ahead of fasthtml's catch-all static route"
+    app.router.routes.insert(0, Route('/public/{fname}', public))
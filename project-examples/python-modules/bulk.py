@@ -0,0 +1,56 @@
+"""Bulk todo imports. An upload is parsed up front, then written a chunk per transaction on the db pool while the
+page follows the import's progress as server-sent events on a stream of its own."""
+from fasthtml.common import *
+from collections import OrderedDict
+from datetime import date
+from events import Broadcast
+import csv, io, json, secrets
+
+DONE_WORDS = {'1','true','yes','y','x','done'}
+
+def parse_todos(filename, data):
+    """`(title, done, due)` tuples from the bytes of a CSV upload with a header row, or a JSON list of objects,
+    with `title`, `done` and `due` (ISO date, today if missing) fields. Raises `ValueError` naming the bad row."""
+    if filename.lower().endswith('.json'):
+        items = json.loads(data)
+        if not isinstance(items, list): raise ValueError('expected a JSON list of todos')
+    else: items = csv.DictReader(io.StringIO(data.decode('utf-8-sig')))
+    today,res = date.today().isoformat(),[]
+    for i,o in enumerate(items, 1):
+        if not isinstance(o, dict): raise ValueError(f'todo {i}: expected an object')
+        if not (title:=str(o.get('title') or '').strip()): raise ValueError(f'todo {i}: missing title')
+        due = str(o.get('due') or today).strip()
+        try: date.fromisoformat(due)
+        except ValueError: raise ValueError(f'todo {i}: bad due date {due!r}') from None
+        res.append((title, str(o.get('done') or '').strip().lower() in DONE_WORDS, due))
+    return res
+
+class ImportJobs:
+    "Recent imports by id, each with the last message sent about it, so a page that connects late catches up"
+    def __init__(self, max_jobs=64): self.jobs,self.events,self.max_jobs = OrderedDict(),Broadcast(),max_jobs
+
+    def start(self):
+        job = secrets.token_urlsafe(8)
+        self.jobs[job] = ()
+        if len(self.jobs) > self.max_jobs: self.jobs.popitem(last=False)
+        return job
+
+    def publish(self, job, *frags):
+        "Send `frags` to everyone following `job`, and keep them for whoever follows it next"
+        if job not in self.jobs: return
+        self.jobs[job] = frags
+        self.events.publish(job, *frags)
+
+    async def stream(self, job, *gone):
+        "Event stream of `job`, starting from its last message; `gone` is sent instead if there's no such job"
+        if job not in self.jobs:
+            yield sse_message(gone)
+            return
+        events = self.events.stream(job)
+        try:
+            yield await anext(events)  # subscribed from here on, so nothing is missed between these two
+            if frags:=self.jobs.get(job): yield sse_message(frags)
+            async for o in events: yield o
+        finally: await events.aclose()
+
+import_jobs = ImportJobs()
@@ -0,0 +1,40 @@
+from fasthtml.common import *
+from collections import OrderedDict
+from datetime import date
+
+class FragmentCache:
+    """LRU of serialized component HTML, keyed by `(kind, id)` and only served while the row version matches.
+    Its size is counted in characters, the `len` of the HTML strings it holds."""
+    def __init__(self, max_chars=8_000_000):
+        self.max_chars,self.nchars,self.hits,self.misses = max_chars,0,0,0
+        self.day,self.items = date.today(),OrderedDict()
+
+    def __call__(self, key, version, render):
+        "HTML for `key` at `version`, calling `render()` to build and store it on a miss"
+        # Overdue styling depends on today's date, so every entry expires at midnight
+        if (today:=date.today()) != self.day: self.clear(); self.day = today
+        hit = self.items.get(key)
+        if hit and hit[0]==version:
+            self.hits += 1
+            self.items.move_to_end(key)
+            return NotStr(hit[1])
+        self.misses += 1
+        html = to_xml(render())
+        self.invalidate(*key)
+        self.items[key] = version,html
+        self.nchars += len(html)
+        while self.nchars > self.max_chars: self.nchars -= len(self.items.popitem(last=False)[1][1])
+        return NotStr(html)
+
+    def invalidate(self, kind, id):
+        "Drop the entry for a row that a write route has changed or deleted"
+        if (old:=self.items.pop((kind,id), None)): self.nchars -= len(old[1])
+
+    def clear(self): self.items.clear(); self.nchars = 0
+
+    def stats(self):
+        total = self.hits+self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits/total if total else 0.,
+                    entries=len(self.items), chars=self.nchars, max_chars=self.max_chars)
+
+card_cache = FragmentCache()
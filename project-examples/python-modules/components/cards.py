@@ -1,12 +1,17 @@
 from fasthtml.common import *
 from monsterui.all import *
 from datetime import date,datetime
+from components.cache import card_cache
+from components.compiled import precompiled
 
 def tid(id): return f'todo-{id}'
 
-def TodoCard(due, done, title, id):
-    dd = datetime.strptime(due, '%Y-%m-%d').date()
-    due_date = Strong(dd.strftime('%Y-%m-%d'),style= "" if date.today() <= dd else "background-color: red;") 
+def is_overdue(due): return due < date.today().isoformat()
+
+@precompiled('due', 'title', 'id')
+def TodoCard(due, done, title, id, overdue=False):
+    "`due` is the row's ISO date, shown as is; `overdue` (see `is_overdue`) picks its styling"
+    due_date = Strong(due, style="background-color: red;" if overdue else "")
     _targets = {'hx_target':f'#{tid(id)}', 'hx_swap':'outerHTML'}
     checkbox = CheckboxX(hx_get=f"/toggle_done?id={id}", **_targets, checked=done)
     delete = Button('delete', hx_delete=f"/delete_todo?id={id}", **_targets)
@@ -20,7 +25,7 @@ def TodoCard(due, done, title, id):
                 id=tid(id))
 
 
-def ProjectCard(name, created, id):
+def ProjectCard(name, created, id, total=0, done=0, overdue=0):
     if isinstance(created, str):
         created_date = datetime.fromisoformat(created.replace('Z', '+00:00')).strftime('%Y-%m-%d')
     else:
@@ -29,5 +34,16 @@ def ProjectCard(name, created, id):
     return Card(
         A(Strong(name), href=f'/project/{id}'),
         P(f"Created: {created_date}", cls=TextPresets.muted_sm),
+        P(f"{total} todos, {done} done", Span(f", {overdue} overdue", style="color: red;") if overdue else '',
+          cls=TextPresets.muted_sm),
         id=f'project-{id}'
-    )
\ No newline at end of file
+    )
+
+
+def CachedTodoCard(due, done, title, id):
+    "`TodoCard` served from `card_cache` for as long as the row is unchanged (the cache is emptied at midnight)"
+    return card_cache(('todo', id), (due, done, title), lambda: TodoCard(due, done, title, id, is_overdue(due)))
+
+def CachedProjectCard(name, created, id, total=0, done=0, overdue=0):
+    "`ProjectCard` served from `card_cache` for as long as the row and its counts are unchanged"
+    return card_cache(('project', id), (name, created, total, done, overdue), lambda: ProjectCard(name, created, id, total, done, overdue))
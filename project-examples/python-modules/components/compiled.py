@@ -0,0 +1,52 @@
+from fasthtml.common import *
+from functools import lru_cache, wraps
+from html import escape
+from inspect import signature
+import re
+
+# Private-use code points: untouched by escaping and never present in real content
+def _mark(i): return f'\ue000{i}\ue001'
+_marker = re.compile('\ue000(\\d+)\ue001')
+
+def _skeleton(html):
+    "Split rendered `html` into static text and `(slot, in_attr)` holes where the slot markers were"
+    parts,holes,pos = [],[],0
+    for m in _marker.finditer(html):
+        parts.append(html[pos:m.start()])
+        holes.append((int(m[1]), html.rfind('<', 0, m.start()) > html.rfind('>', 0, m.start())))
+        pos = m.end()
+    return parts+[html[pos:]], holes
+
+def _fill(v, in_attr):
+    "Escape `v` exactly as `to_xml` would, or `None` if it would change the markup around it"
+    if v is None or isinstance(v, bool) or hasattr(v, '__html__'): return None
+    if not in_attr: return escape(v) if isinstance(v, str) else f'{v}'
+    s = escape(v, quote=False) if isinstance(v, str) else str(v)
+    # `to_xml` drops empty attributes and switches quote style around quotes, so those go the slow way
+    return None if not s or '"' in s or "'" in s else s
+
+def precompiled(*slots, context=None):
+    """Render `f` once per variant into a static HTML skeleton with escaped holes for `slots`.
+    Arguments not in `slots` (plus `context()`, for anything else the output depends on) pick the variant;
+    slot values must be used verbatim by `f`. `f.__wrapped__` is the uncompiled FT version; `f.cache_info()`
+    counts the variants compiled."""
+    def deco(f):
+        sig = signature(f)
+        @lru_cache(maxsize=1024)
+        def _compile(fixed, ctx): return _skeleton(to_xml(f(**{k:v for k,_,v in fixed}, **{s:_mark(i) for i,s in enumerate(slots)})))
+        @wraps(f)
+        def _f(*args, **kwargs):
+            kw = sig.bind(*args, **kwargs)
+            kw.apply_defaults()
+            kw = kw.arguments
+            # Types are part of the key: `True` and `1` hash alike but render differently
+            try: parts,holes = _compile(tuple((k,type(v),v) for k,v in kw.items() if k not in slots), context() if context else None)
+            except TypeError: return f(*args, **kwargs)  # unhashable variant
+            vals = [_fill(kw[slots[i]], in_attr) for i,in_attr in holes]
+            if None in vals: return f(*args, **kwargs)
+            res = [parts[0]]
+            for v,p in zip(vals, parts[1:]): res += [v,p]
+            return NotStr(''.join(res))
+        _f.cache_info,_f.cache_clear = _compile.cache_info,_compile.cache_clear
+        return _f
+    return deco
@@ -33,5 +33,24 @@ def mk_todo_form(project_id, todo=None, btn_text="Add"):
         
     return Form(DivLAligned(
         *inputs,
-        Button(btn_text, cls=ButtonT.primary, hx_post="/upsert_todo", hx_target='#todo-list', hx_swap='innerHTML')),
-        id='todo-input', cls='mb-6')
\ No newline at end of file
+        Button(btn_text, cls=ButtonT.primary, hx_post="/upsert_todo", hx_swap='none')),
+        id='todo-input', cls='mb-6')
+
+def mk_todo_search(project_id):
+    "Active search box: 300ms after typing stops, the project's best matching todos replace the list"
+    return Input(type='search', name='q', placeholder='Search todos', id='todo-search', cls='mb-6',
+                 hx_get=f'/search_todos?project_id={project_id}', hx_trigger='input changed delay:300ms, search',
+                 hx_target='#todo-grid', hx_swap='innerHTML', hx_sync='this:replace')
+
+def mk_bulk_actions(project_id):
+    "Actions on all of a project's todos at once, and an upload of many new ones from a CSV or JSON file"
+    return DivLAligned(
+        Button('Complete all', hx_post=f'/complete_all?project_id={project_id}', hx_swap='none'),
+        Button('Delete completed', hx_post=f'/delete_completed?project_id={project_id}', hx_swap='none',
+               hx_confirm='Delete every completed todo in this project?'),
+        Form(Input(type='file', name='file', accept='.csv,.json', required=True),
+             Button('Import', cls=ButtonT.primary),
+             hx_post=f'/import_todos?project_id={project_id}', hx_encoding='multipart/form-data',
+             hx_target='#import-progress', hx_swap='outerHTML', cls='flex gap-2'),
+        Div(id='import-progress'),
+        cls='mb-6')
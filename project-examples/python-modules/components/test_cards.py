@@ -0,0 +1,37 @@
+"The `@precompiled` `TodoCard` must render byte-for-byte what its FT version does"
+import random, sys
+from datetime import date, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fasthtml.common import *
+from components.cards import TodoCard
+
+titles = ['Buy milk', '', ' padded ', '<script>alert(1)</script>', 'Tom & Jerry', 'say "hi"', "it's",
+          '`back` \'n\' "forth"', 'ünïcödé ✓', '&amp; already escaped', 'a\nb', '{braces}', '%s %d']
+
+def rows(n, seed=0):
+    "`n` random `TodoCard` arguments, with dates around today and every `done` type the app may pass"
+    rng,today = random.Random(seed),date.today()
+    for id in range(1, n+1):
+        due = (today + timedelta(days=rng.randint(-60, 60))).isoformat()
+        yield due, rng.choice([0, 1, True, False]), rng.choice(titles)+(f' {id}' if rng.random()<.5 else ''), id, due < today.isoformat()
+
+def check(row): assert to_xml(TodoCard(*row))==to_xml(TodoCard.__wrapped__(*row)), row  # unfillable values give the FT back
+
+def test_random_rows():
+    for row in rows(2000): check(row)
+
+def test_titles():
+    for done in (0, 1, True, False):
+        for overdue in (True, False):
+            for title in titles: check(('2030-01-01', done, title, 1, overdue))
+
+def test_awkward_due_and_id():
+    for due in ('2030-01-01', '', '<b>', 'say "hi"', "it's", 'a & b'):
+        for id in (1, 0, -1, '7', 'x"y'): check((due, False, 'title', id, False))
+
+def test_one_skeleton_per_variant():
+    "`due` is a slot, so any number of distinct dates share the skeletons of each `done` and `overdue`"
+    TodoCard.cache_clear()
+    for row in rows(3000): TodoCard(*row)
+    assert TodoCard.cache_info().currsize==8  # `done` in 0, 1, True, False (types are part of the key) x `overdue`
@@ -0,0 +1,111 @@
+"""Response compression for python-modules, the layout meant to be served as is. The three teaching layouts are
+left uncompressed, as they would sit behind a proxy that compresses (or are run locally, where it doesn't matter)."""
+from starlette.datastructures import MutableHeaders
+from collections import OrderedDict
+import struct, zlib
+try: import brotli
+except ImportError: brotli = None  # `pip install brotli` to offer `br`
+
+MIN_SIZE = 1024
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+# `(start, end)` markers of spans that are byte-identical across responses: the app's head after the per-page
+# title/canonical link, and the new project form (plain `find`s, as a regex scan costs more than compressing the
+# span). The todo form is not one: it carries the project's id and today's date.
+INVARIANT = ((b'<meta charset=', b'</head>'),
+             (b'<form enctype="multipart/form-data" id="project-input"', b'</form>'))
+
+def spans(body):
+    "Offsets of the first occurrence of each `INVARIANT` span in `body`, in order"
+    res = []
+    for start,end in INVARIANT:
+        if (i:=body.find(start)) >= 0 and (j:=body.find(end, i)) >= 0: res.append((i, j+len(end)))
+    return sorted(res)
+
+def accepted(accept_encoding):
+    "`{coding: q}` from an `Accept-Encoding` header"
+    res = {}
+    for part in accept_encoding.split(','):
+        coding,_,params = part.partition(';')
+        try: q = float(params.split('=', 1)[1]) if 'q=' in params else 1.
+        except ValueError: q = 0.
+        if coding:=coding.strip().lower(): res[coding] = q
+    return res
+
+def negotiate(accept_encoding):
+    "`br` or `gzip` if the client takes it (brotli only when installed), else `None`"
+    acc = accepted(accept_encoding)
+    for coding in ('br', 'gzip') if brotli else ('gzip',):
+        if acc.get(coding, acc.get('*', 0)) > 0: return coding
+
+class DeflateBlocks:
+    """Gzip that reuses precompressed deflate blocks for `INVARIANT` spans.
+    Every block ends in a full flush: byte aligned and with no back references, so blocks from separate
+    compressors splice into one valid deflate stream."""
+    def __init__(self, level=6, max_items=256): self.level,self.max_items,self.items = level,max_items,OrderedDict()
+
+    def block(self, span):
+        if (res:=self.items.get(span)) is not None:
+            self.items.move_to_end(span)
+            return res
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.items[span] = res = c.compress(span)+c.flush(zlib.Z_FULL_FLUSH)
+        if len(self.items) > self.max_items: self.items.popitem(last=False)
+        return res
+
+    def gzip(self, body):
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        parts,pos = [b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'],0
+        for i,j in spans(body):
+            parts += [c.compress(body[pos:i]), c.flush(zlib.Z_FULL_FLUSH), self.block(body[i:j])]
+            pos = j
+        parts += [c.compress(body[pos:]), c.flush(zlib.Z_FINISH), struct.pack('<II', zlib.crc32(body), len(body) & 0xffffffff)]
+        return b''.join(parts)
+
+class Compression:
+    """ASGI middleware compressing text responses with brotli or gzip. Streamed bodies are compressed as they go,
+    flushing each chunk; complete ones under `min_size` bytes, like small htmx swaps, barely shrink and stay as they are."""
+    def __init__(self, app, min_size=MIN_SIZE, gzip_level=6, br_quality=4):
+        self.app,self.min_size,self.br_quality,self.blocks = app,min_size,br_quality,DeflateBlocks(gzip_level)
+
+    def compress(self, body, coding):
+        return brotli.compress(body, quality=self.br_quality) if coding=='br' else self.blocks.gzip(body)
+
+    def compressor(self, coding):
+        "`f(chunk, more_body)` compressing a streamed body, flushed after each chunk so the client can render it"
+        if coding=='br':
+            c = brotli.Compressor(quality=self.br_quality)
+            return lambda chunk,more: c.process(chunk)+(c.flush() if more else c.finish())
+        c = zlib.compressobj(self.blocks.level, zlib.DEFLATED, 16+zlib.MAX_WBITS)
+        return lambda chunk,more: c.compress(chunk)+c.flush(zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type']!='http': return await self.app(scope, receive, send)
+        coding = negotiate(dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1'))
+        start,stream = None,None
+        async def _send(msg):
+            nonlocal start,stream
+            if msg['type']=='http.response.start':
+                hdrs = MutableHeaders(scope=msg)
+                hdrs.add_vary_header('Accept-Encoding')
+                ctype = hdrs.get('content-type', '')
+                # Event streams have to reach the client as they are written, so they are never held back
+                if coding and 'content-encoding' not in hdrs and ctype.startswith(COMPRESSIBLE) and not ctype.startswith('text/event-stream'): start = msg
+                else: await send(msg)
+                return
+            if stream is not None and msg['type']=='http.response.body':
+                msg = dict(msg, body=stream(msg.get('body', b''), msg.get('more_body', False)))
+            elif start is not None and msg['type']=='http.response.body':
+                msg,body = dict(msg),msg.get('body', b'')
+                hdrs = MutableHeaders(scope=start)
+                if msg.get('more_body'):
+                    stream = self.compressor(coding)
+                    msg['body'] = stream(body, True)
+                    hdrs['content-encoding'] = coding
+                    if 'content-length' in hdrs: del hdrs['content-length']
+                elif len(body) >= self.min_size:
+                    msg['body'] = self.compress(body, coding)
+                    hdrs['content-encoding'],hdrs['content-length'] = coding,str(len(msg['body']))
+                await send(start)
+                start = None
+            await send(msg)
+        await self.app(scope, receive, _send)
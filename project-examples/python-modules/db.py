@@ -1,5 +1,10 @@
 from fasthtml.common import *
 from datetime import date,datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+import apsw, asyncio, json, queue, sys, threading, time
 
 class Project:
     id: int
@@ -12,7 +17,342 @@ class Todo:
     done: bool
     due: date
     project_id: int
-    
-db = database('todos.db')
-db.projects = db.create(Project)
-db.todos = db.create(Todo)
\ No newline at end of file
+
+flexiclass(Project); flexiclass(Todo)
+
+# Compact rows with only the columns the cards render, built straight from the cursor's tuples (no dict per row)
+TodoRow = namedtuple('TodoRow', 'id title done due')
+ProjectRow = namedtuple('ProjectRow', 'id name created total done overdue')
+
+DB_PATH = 'todos.db'
+DB_THREADS = 4
+BUSY_TIMEOUT_MS = 5000
+SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'normal')  # `full` fsyncs the WAL on every commit
+SCHEMA_VERSION = 4
+
+# Todo totals per project and due date, kept current by triggers on every write from any connection. Bucketing by
+# date lets the index count overdue todos for any day, in one read whose size doesn't grow with the number of todos.
+COUNTS_SCHEMA = '''
+create table if not exists todo_counts (project_id integer, due text, total integer, done integer,
+                                        primary key (project_id, due)) without rowid;
+create trigger if not exists todo_counts_insert after insert on todo begin
+    insert into todo_counts values (new.project_id, new.due, 1, iif(new.done, 1, 0))
+        on conflict do update set total=total+1, done=done+excluded.done;
+end;
+create trigger if not exists todo_counts_delete after delete on todo begin
+    update todo_counts set total=total-1, done=done-iif(old.done, 1, 0) where project_id=old.project_id and due=old.due;
+    delete from todo_counts where project_id=old.project_id and due=old.due and total=0;
+end;
+create trigger if not exists todo_counts_update after update of project_id, due, done on todo begin
+    update todo_counts set total=total-1, done=done-iif(old.done, 1, 0) where project_id=old.project_id and due=old.due;
+    delete from todo_counts where project_id=old.project_id and due=old.due and total=0;
+    insert into todo_counts values (new.project_id, new.due, 1, iif(new.done, 1, 0))
+        on conflict do update set total=total+1, done=done+excluded.done;
+end;
+'''
+
+# Full-text index of todo titles, with 2 and 3 letter prefixes indexed for the search box. It reads the titles from
+# `todo` (external content), and triggers keep it in step with every write.
+SEARCH_SCHEMA = '''
+create virtual table if not exists todo_fts using fts5(title, content='todo', content_rowid='id', prefix='2 3');
+create trigger if not exists todo_fts_insert after insert on todo begin
+    insert into todo_fts(rowid, title) values (new.id, new.title);
+end;
+create trigger if not exists todo_fts_delete after delete on todo begin
+    insert into todo_fts(todo_fts, rowid, title) values ('delete', old.id, old.title);
+end;
+create trigger if not exists todo_fts_update after update of title on todo begin
+    insert into todo_fts(todo_fts, rowid, title) values ('delete', old.id, old.title);
+    insert into todo_fts(rowid, title) values (new.id, new.title);
+end;
+'''
+
+# A write counter per table, bumped by triggers on every row any connection writes, so a cache of one table's rows
+# can tell whether that table changed; `pragma data_version` only says that something in the file did.
+VERSIONS_SCHEMA = '''
+create table if not exists table_versions (name text primary key, version integer not null default 0) without rowid;
+insert or ignore into table_versions (name) values ('project'), ('todo');
+create trigger if not exists project_version_insert after insert on project begin
+    update table_versions set version=version+1 where name='project';
+end;
+create trigger if not exists project_version_update after update on project begin
+    update table_versions set version=version+1 where name='project';
+end;
+create trigger if not exists project_version_delete after delete on project begin
+    update table_versions set version=version+1 where name='project';
+end;
+create trigger if not exists todo_version_insert after insert on todo begin
+    update table_versions set version=version+1 where name='todo';
+end;
+create trigger if not exists todo_version_update after update on todo begin
+    update table_versions set version=version+1 where name='todo';
+end;
+create trigger if not exists todo_version_delete after delete on todo begin
+    update table_versions set version=version+1 where name='todo';
+end;
+'''
+
+def connect(path=DB_PATH):
+    "Open `path` with the WAL, busy timeout and sync settings shared by every connection in every worker"
+    deadline = time.monotonic()+BUSY_TIMEOUT_MS/1000
+    while True:
+        # apsw's connect-time `pragma optimize` fails straight away on a locked db instead of waiting
+        try: d = database(path); break
+        except apsw.BusyError:
+            if time.monotonic() > deadline: raise
+            time.sleep(.01)
+    d.execute(f'pragma busy_timeout={BUSY_TIMEOUT_MS}')
+    # Persistent in the file, but set here rather than left to whichever tool created it: readers never block the writer
+    d.execute('pragma journal_mode=wal')
+    d.execute(f'pragma synchronous={SYNCHRONOUS}')
+    d.execute('pragma recursive_triggers=on')  # so the rows `insert or replace` deletes also leave `todo_counts`
+    d.projects,d.todos = d.t.project,d.t.todo
+    d.projects.cls,d.todos.cls = Project,Todo
+    return d
+
+def schema_version(d): return d.q('pragma user_version')[0]['user_version']
+
+def init_schema(d):
+    "Create the tables and indexes, or bring an older file up to `SCHEMA_VERSION`"
+    if schema_version(d) >= SCHEMA_VERSION: return
+    # Workers starting together queue on the write lock; the first creates the schema, the rest find it done
+    d.execute('begin immediate')
+    try:
+        if (version:=schema_version(d)) >= SCHEMA_VERSION: return d.execute('commit')
+        d.create(Project)
+        d.create(Todo)
+        d.todos.create_index(['project_id', 'due'], if_not_exists=True)
+        d.conn.execute(COUNTS_SCHEMA)
+        d.conn.execute(SEARCH_SCHEMA)
+        d.conn.execute(VERSIONS_SCHEMA)
+        # For todos written before the triggers existed
+        rebuild_counts(d)
+        rebuild_search(d)
+        d.execute(f'pragma user_version={SCHEMA_VERSION}')
+        d.execute('commit')
+    except BaseException:
+        d.execute('rollback')
+        raise
+
+_count_todos = 'select project_id, due, count(*), sum(iif(done, 1, 0)) from todo group by project_id, due'
+
+def rebuild_counts(d):
+    "Recount `todo_counts` from the todos, inside the caller's transaction"
+    d.execute('delete from todo_counts')
+    d.execute(f'insert into todo_counts {_count_todos}')
+
+def rebuild_search(d): d.execute("insert into todo_fts(todo_fts) values ('rebuild')")
+
+def check_counts(d):
+    "`(project_id, due, stored, actual)` `(total, done)`s of every `todo_counts` bucket that disagrees with the todos"
+    d.execute('begin')  # one snapshot for both reads
+    try:
+        stored = {(p,due): (t,n) for p,due,t,n in d.execute('select * from todo_counts')}
+        actual = {(p,due): (t,n) for p,due,t,n in d.execute(_count_todos)}
+    finally: d.execute('commit')
+    return [(*k, stored.get(k), actual.get(k)) for k in sorted(stored.keys()|actual.keys(), key=str) if stored.get(k)!=actual.get(k)]
+
+db = connect()
+init_schema(db)
+
+_todos_first   = f'select * from {db.todos} where project_id=? order by due, id limit ?'
+_todos_after   = f'select * from {db.todos} where project_id=? and (due,id)>(?,?) order by due, id limit ?'
+_todo_by_id    = f'select * from {db.todos} where id=?'
+_project_by_id = f'select * from {db.projects} where id=?'
+_toggle_todo   = f'update {db.todos} set done = not done where id=? returning *'
+_delete_todo   = f'delete from {db.todos} where id=? returning project_id'
+# A chunk of `(title, done, due)` rows as one JSON array: one statement per chunk rather than per row
+_import_todos  = f"insert into {db.todos} (title, done, due, project_id) select value->>0, value->>1, value->>2, ? from json_each(?)"
+_complete_todos = f'update {db.todos} set done=1 where project_id=? and not done'
+_delete_done   = f'delete from {db.todos} where project_id=? and done returning id'
+_todo_rows_first = f'select {",".join(TodoRow._fields)} from {db.todos} where project_id=? order by due, id limit ?'
+_todo_rows_after = f'select {",".join(TodoRow._fields)} from {db.todos} where project_id=? and (due,id)>(?,?) order by due, id limit ?'
+# Scoped by the join: cheaper than intersecting with a per-project token in the index, which lists every todo
+_search_rows     = f'''select t.id, t.title, t.done, t.due from todo_fts f join {db.todos} t on t.id=f.rowid
+    where todo_fts match ? and t.project_id=? order by f.rank limit ?'''
+_project_rows    = f'''select p.id, p.name, p.created, coalesce(c.total, 0), coalesce(c.done, 0), coalesce(c.overdue, 0)
+    from {db.projects} p left join (select project_id, sum(total) total, sum(done) done, sum(iif(due<?, total-done, 0)) overdue
+                                    from todo_counts group by project_id) c on c.project_id=p.id'''
+
+_local = threading.local()
+on_connect = []  # called with each pool thread's new connection
+
+def _connect():
+    "Give this pool thread its own connection, with the same tables as `db`"
+    _local.db = d = connect()
+    for f in on_connect: f(d)
+
+_pool = ThreadPoolExecutor(DB_THREADS, thread_name_prefix='db', initializer=_connect)
+
+_version_db = None
+
+def data_version():
+    "A number that changes whenever any connection, in this process or another, commits to the db file"
+    global _version_db
+    # Its own connection, which never writes: `data_version` doesn't count the connection's own commits
+    if _version_db is None: _version_db = connect()
+    return _version_db.q('pragma data_version')[0]['data_version']
+
+_versions = None,{}
+
+def table_versions():
+    "`{table: version}` of the tables in `table_versions` as of the last commit to the file, only re-read after one"
+    global _versions
+    if (version:=data_version()) != _versions[0]: _versions = version,dict(_version_db.execute('select name, version from table_versions'))
+    return _versions[1]
+
+def db_version():
+    "A db-wide write counter: the total of `table_versions`, which is stored in the file, so every process agrees on it"
+    return sum(table_versions().values())
+
+def cur_db():
+    "The calling pool thread's connection, or `db` outside the pool"
+    return getattr(_local, 'db', db)
+
+async def in_db(f, *args, **kwargs):
+    "Run the blocking data-access call `f` on the db pool, so a slow query doesn't stall the event loop"
+    return await asyncio.get_running_loop().run_in_executor(_pool, partial(copy_context().run, f, *args, **kwargs))
+
+def _settle(fut, res, exc):
+    if fut.done(): return  # the request went away
+    if exc is None: fut.set_result(res)
+    else: fut.set_exception(exc)
+
+class GroupCommit:
+    """Run write calls from concurrent requests on one writer thread, `max_batch` at a time in a shared transaction.
+    A batch closes `window` seconds after its first write; each caller is answered only once its batch has committed."""
+    def __init__(self, window=0.002, max_batch=64): self.window,self.max_batch,self.q,self.thread = window,max_batch,queue.SimpleQueue(),None
+
+    async def __call__(self, f, *args, **kwargs):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='db-writer', daemon=True)
+            self.thread.start()
+        fut = asyncio.get_running_loop().create_future()
+        self.q.put((partial(copy_context().run, f, *args, **kwargs), fut))
+        return await fut
+
+    def batch(self):
+        res,deadline = [self.q.get()],time.monotonic()+self.window
+        while len(res) < self.max_batch and (left:=deadline-time.monotonic()) > 0:
+            try: res.append(self.q.get(timeout=left))
+            except queue.Empty: break
+        return res
+
+    def commit(self, batch):
+        "Run `batch` in one transaction, each write in its own savepoint so a failing one only fails its caller"
+        d,res = cur_db(),[]
+        d.execute('begin immediate')
+        try:
+            for f,fut in batch:
+                d.execute('savepoint write')
+                try: res.append((fut, f(), None))
+                except Exception as e:
+                    d.execute('rollback to write')
+                    res.append((fut, None, e))
+                d.execute('release write')
+            d.execute('commit')
+        except BaseException as e:
+            if not d.conn.getautocommit(): d.execute('rollback')
+            return [(fut, None, e) for _,fut in batch]
+        return res
+
+    def run(self):
+        _connect()
+        while True:
+            for fut,r,e in self.commit(self.batch()): fut.get_loop().call_soon_threadsafe(_settle, fut, r, e)
+
+# Opt in with e.g. `WRITE_BATCH_MS=2 WRITE_BATCH_SIZE=64`
+group_commit = GroupCommit(float(os.getenv('WRITE_BATCH_MS'))/1000, int(os.getenv('WRITE_BATCH_SIZE', 64))) if os.getenv('WRITE_BATCH_MS') else None
+
+async def write_db(f, *args, **kwargs):
+    "Run the write call `f` through `group_commit` if it is enabled, else on the db pool like `in_db`"
+    return await (group_commit or in_db)(f, *args, **kwargs)
+
+def _one(cls, sql, id, default):
+    row = first(cur_db().q(sql, (id,)))
+    if row is not None: return cls(**row)
+    if default is UNSET: raise NotFoundError()
+    return default
+
+def get_todo(id, default=UNSET):    return _one(Todo,    _todo_by_id,    id, default)
+def get_project(id, default=UNSET): return _one(Project, _project_by_id, id, default)
+def iter_project_rows():
+    "Every project as a `ProjectRow`, with its todos counted from `todo_counts`; overdue is open and due before today"
+    return map(ProjectRow._make, cur_db().execute(_project_rows, (date.today().isoformat(),)))
+def project_rows(): return list(iter_project_rows())
+
+def insert_project(project): return cur_db().projects.insert(project)
+def save_todo(todo):         return cur_db().todos.insert(todo, replace=True)
+
+def remove_todo(id):
+    "Delete a todo and return the project it was in"
+    return _one(dict, _delete_todo, id, UNSET)['project_id']
+
+def toggle_todo(id):
+    "Flip `done` in one atomic statement, so concurrent toggles can't lose updates, and return the new row"
+    return _one(Todo, _toggle_todo, id, UNSET)
+
+def todos_for_project(project_id, after=None, limit=-1):
+    "Todos of a project in `(due, id)` order, starting after the `(due, id)` key `after` if given"
+    if after is None: return [Todo(**o) for o in cur_db().query(_todos_first, (project_id, limit))]
+    return [Todo(**o) for o in cur_db().query(_todos_after, (project_id, *after, limit))]
+
+def complete_todos(project_id):
+    "Mark all of a project's open todos done, in one statement, and return how many there were"
+    d = cur_db()
+    d.execute(_complete_todos, (project_id,))
+    return d.conn.changes()
+
+def delete_done_todos(project_id):
+    "Delete all of a project's completed todos, in one statement, and return their ids"
+    return [id for id, in cur_db().execute(_delete_done, (project_id,))]
+
+IMPORT_CHUNK = 5000
+
+def import_todos(project_id, rows, progress=noop, chunk=IMPORT_CHUNK):
+    """Insert `(title, done, due)` `rows` into a project, calling `progress(n)` after each chunk. Every chunk is its
+    own transaction, so other writers get in between; a failure leaves the chunks committed before it in place."""
+    d,n = cur_db(),0
+    for batch in chunked(rows, chunk):
+        d.execute('begin immediate')
+        try: d.execute(_import_todos, (project_id, json.dumps(batch)))
+        except BaseException:
+            d.execute('rollback')
+            raise
+        d.execute('commit')
+        n += len(batch)
+        progress(n)
+    return n
+
+def iter_todo_rows(project_id, after=None, limit=-1):
+    "`todos_for_project` as `TodoRow`s read off the cursor as they are consumed, which must be on the calling thread"
+    if after is None: return map(TodoRow._make, cur_db().execute(_todo_rows_first, (project_id, limit)))
+    return map(TodoRow._make, cur_db().execute(_todo_rows_after, (project_id, *after, limit)))
+
+def todo_rows(project_id, after=None, limit=-1): return list(iter_todo_rows(project_id, after, limit))
+
+def search_todo_rows(project_id, terms, limit=20):
+    "`TodoRow`s of the project whose titles have all `terms`, the last as a prefix, best match first"
+    phrases = [f'"{t}"' for t in terms[:-1]]+[f'"{terms[-1]}"*']  # `terms` are words, so quoting them is enough
+    return list(map(TodoRow._make, cur_db().execute(_search_rows, (' '.join(phrases), project_id, limit))))
+
+def next_todo(todo):
+    "The todo after `todo` in its project's `(due, id)` order, or `None` if it is the last one"
+    return first(todos_for_project(todo.project_id, (todo.due, todo.id), 1))
+
+def main(cmd=None):
+    "`python db.py [check-counts|rebuild-counts|rebuild-search]`"
+    if cmd=='check-counts':
+        for o in (bad:=check_counts(db)): print('project %s, due %s: stored %s, actual %s' % o)
+        sys.exit(f'{len(bad)} todo_counts buckets are off, fix them with `python db.py rebuild-counts`' if bad else 0)
+    if cmd in ('rebuild-counts', 'rebuild-search'):
+        db.execute('begin immediate')
+        try: (rebuild_counts if cmd=='rebuild-counts' else rebuild_search)(db)
+        except BaseException:
+            db.execute('rollback')
+            raise
+        db.execute('commit')
+        return
+    sys.exit(main.__doc__)
+
+if __name__ == '__main__': main(*sys.argv[1:2])
@@ -0,0 +1,48 @@
+from fasthtml.common import *
+from collections import defaultdict, deque
+import asyncio
+
+# Tells a subscriber that fell behind to refetch instead of replaying what it missed
+RESYNC = 'event: resync\ndata: \n\n'
+
+class Subscriber:
+    __slots__ = 'msgs','ready'
+    def __init__(self): self.msgs,self.ready = deque(),asyncio.Event()
+
+class Broadcast:
+    """Per-key fan-out of server-sent events. A message is encoded once and queued to every subscriber of its key;
+    a subscriber more than `max_queue` messages behind has its backlog replaced by a single `RESYNC`."""
+    def __init__(self, max_queue=64, heartbeat=15): self.subs,self.max_queue,self.heartbeat = defaultdict(set),max_queue,heartbeat
+
+    def publish(self, key, *frags):
+        "Queue `frags` as one `message` event for everyone subscribed to `key`, and return how many that was"
+        if not (subs:=self.subs.get(key)): return 0
+        msg = sse_message(frags)
+        for sub in subs:
+            if len(sub.msgs) >= self.max_queue: sub.msgs.clear(); sub.msgs.append(RESYNC)
+            elif not sub.msgs or sub.msgs[0] is not RESYNC: sub.msgs.append(msg)
+            sub.ready.set()
+        return len(subs)
+
+    async def stream(self, key):
+        "Event stream of what's published to `key`, with a comment every `heartbeat` seconds to notice dead peers"
+        sub = Subscriber()
+        self.subs[key].add(sub)
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                try: await asyncio.wait_for(sub.ready.wait(), self.heartbeat)
+                except TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                sub.ready.clear()
+                msgs = ''.join(sub.msgs)
+                sub.msgs.clear()
+                yield msgs
+        finally:
+            self.subs[key].discard(sub)
+            if not self.subs[key]: del self.subs[key]
+
+    def stats(self): return dict(keys=len(self.subs), subscribers=sum(map(len, self.subs.values())))
+
+todo_events = Broadcast()
@@ -1,61 +1,211 @@
 from fasthtml.common import *
-from datetime import datetime
+from datetime import date,datetime
+import asyncio
 from monsterui.all import *
-from db import db, Project, Todo
-from components.cards import TodoCard
+from db import db, on_connect, in_db, write_db, db_version, Project, Todo, get_todo, get_project, project_rows, todo_rows, next_todo, toggle_todo, \
+               insert_project, save_todo, remove_todo, complete_todos, delete_done_todos, import_todos
+from components.cards import CachedTodoCard
+from components.cache import card_cache
 from components.forms import mk_todo_form
-from pages import ProjectTodosPage, ProjectPage, mk_todo_list, mk_project_list
-app, rt = fast_app(hdrs=Theme.slate.headers())
+from pages import ProjectTodosPage, ProjectPage, mk_todo_page, mk_todo_swap, mk_todo_removal, mk_project_list, mk_todo_grid, \
+                  mk_search_results, mk_import_progress, mk_import_status, mk_import_done
+from compression import Compression
+from events import todo_events
+from streaming import Rows, stream_page
+from search import search_terms, search_cache
+from bulk import parse_todos, import_jobs
+from rowcache import row_cache
+import profiling
+from assets import local_hdrs, serve_public
+app, rt = fast_app(hdrs=local_hdrs(*def_hdrs(), *Theme.slate.headers(), Script(src='https://cdn.jsdelivr.net/npm/htmx-ext-sse@2.2.3/sse.js')),
+                   default_hdrs=False)
+serve_public(app)
+app.add_middleware(Compression)
+# Per-route phase timings and cache counters on `/metrics` with `METRICS=1`, from the `metrics.py` the layouts share
+if os.getenv('METRICS'):
+    sys.path.append(str(Path(__file__).parent.parent))
+    from metrics import phase_metrics
+    phase_metrics.install(app, db)
+    on_connect.append(phase_metrics.trace_db)
+    for name,o in ('row_cache', row_cache),('card_cache', card_cache),('search_cache', search_cache),('todo_events', todo_events):
+        phase_metrics.add_stats(name, o.stats)
+profiling.install(app)  # outermost, so a profile covers compression and metrics too
 
 def tid(id): return f'todo-{id}'
 
+PAGE_SIZE = 50
+FETCH_SIZE = 50  # rows per query while streaming a page
+
+def more_url(project_id, todo): return f'/more_todos?project_id={project_id}&due={todo.due}&id={todo.id}'
+
+def todos_page(project_id, due=None, id=None, page_size=PAGE_SIZE):
+    "One keyset page of todos after `(due, id)`, and the URL of the page that follows it (if any)"
+    todos_list = todo_rows(project_id, None if due is None else (due,id), page_size+1)
+    if len(todos_list) <= page_size: return todos_list, None
+    return todos_list[:page_size], more_url(project_id, todos_list[page_size-1])
+
+async def stream_todos(project_id, page_size=None):
+    "`mk_todo_page` of the project's first page, queried `FETCH_SIZE` rows at a time as the response is sent"
+    left,after = page_size or PAGE_SIZE,None
+    while True:
+        n = min(FETCH_SIZE, left)
+        todos_list = await in_db(todo_rows, project_id, after, n+1)  # one extra, to know if any follow
+        more,todos_list = len(todos_list) > n,todos_list[:n]
+        left -= n
+        if not more or not left:
+            for o in mk_todo_page(todos_list, more_url(project_id, todos_list[-1]) if more else None): yield o
+            return
+        for t in todos_list: yield CachedTodoCard(t.due, t.done, t.title, t.id)
+        after = todos_list[-1].due,todos_list[-1].id
+
+def todo_anchor(todo):
+    "Id of the element a todo's card belongs in front of: its `(due, id)` successor, or the end of the list"
+    nxt = next_todo(todo)
+    return tid(nxt.id) if nxt else 'todo-list-end'
+
+async def page_etag(req, *key):
+    """Weak ETag for a page of `key` built from the db as it is now; the date is in it for the overdue styling.
+    `db_version` is read from the file, so with `WORKERS=N` any worker can answer a tag another one issued."""
+    return f'W/"{await in_db(db_version)}-{date.today()}-{int("hx-request" in req.headers)}-{"-".join(map(str, key))}"'
+
+def not_modified(req, etag):
+    "A 304 with the page's validators and caching headers if the client's `If-None-Match` already has `etag`, else `None`"
+    tags = {o.strip().removeprefix('W/') for o in req.headers.get('if-none-match', '').split(',')}
+    if '*' in tags or etag.removeprefix('W/') in tags: return Response(status_code=304, headers=etag_hdrs(etag))
+
+def etag_hdrs(etag):
+    "Headers that make clients revalidate with `etag` before reusing the page, named as fasthtml names its own `vary`"
+    return {'etag': etag, 'cache-control': 'no-cache', 'vary': 'HX-Request, HX-History-Restore-Request'}
+
 @app.delete
 async def delete_todo(id:int):
     "Delete if it exists, if not someone else already deleted it so no action needed"
-    try: db.todos.delete(id)
+    try: todo_events.publish(await write_db(remove_todo, id), mk_todo_removal(id))
     except NotFoundError: pass
+    card_cache.invalidate('todo', id)
+    row_cache.invalidate('todo', id)
 
 @rt
-async def index():
+async def index(req):
     "Main page showing all projects"
-    return ProjectPage(db.projects())
+    etag = await page_etag(req, 'index')
+    if resp:=not_modified(req, etag): return resp
+    return *ProjectPage(await in_db(project_rows)), *(HttpHeader(k, v) for k,v in etag_hdrs(etag).items())
 
 @rt
 async def create_project(name: str):
     if name.strip():
-        db.projects.insert(Project(name=name.strip(), created=datetime.now()))
-    return mk_project_list(db.projects())
+        project = await write_db(insert_project, Project(name=name.strip(), created=datetime.now()))
+        card_cache.invalidate('project', project.id)
+        row_cache.invalidate('project', project.id)
+    return mk_project_list(await in_db(project_rows))
 
 @rt('/project/{project_id}')
-async def project_todos(project_id: int):
+async def project_todos(req, project_id: int):
     "Todo list for a specific project"
-    project = db.projects[project_id]
-    todos_list = db.todos(where=f'project_id={project_id}', order_by='due')
-    return ProjectTodosPage(project.name, project_id, todos_list)
+    etag = await page_etag(req, 'project', project_id)
+    if resp:=not_modified(req, etag): return resp
+    project = await row_cache('project', project_id, get_project)
+    # The head, back link and form are sent before the todos are queried
+    return stream_page(req, *ProjectTodosPage(project.name, project_id, Rows(stream_todos(project_id))), headers=etag_hdrs(etag))
+
+@rt('/project/{project_id}/events')
+async def project_events(project_id:int):
+    "Server-sent OOB swaps of the project's todos as any client changes them"
+    return EventStream(todo_events.stream(project_id))
+
+@rt
+async def more_todos(project_id:int, due:str, id:int):
+    "Next page of todos, swapped in place of the sentinel that requested it"
+    return tuple(mk_todo_page(*await in_db(todos_page, project_id, due, id)))
+
+@rt
+async def search_todos(project_id:int, q:str=''):
+    "Active search: the project's todos best matching `q`, or its usual first page once the box is cleared"
+    if not (terms:=search_terms(q)): return tuple(mk_todo_page(*await in_db(todos_page, project_id)))
+    return mk_search_results(await search_cache(project_id, terms))
 
 @rt 
 async def upsert_todo(todo:Todo):
-    if todo.title.strip(): db.todos.insert(todo,replace=True)
-    todos_list = db.todos(where=f'project_id={todo.project_id}', order_by='due')
-    return mk_todo_list(todo.project_id, todos_list),mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    "Saves the todo and returns only its card, swapped into place out of band, plus a fresh form"
+    form = mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    if not todo.title.strip(): return form
+    old = await row_cache('todo', todo.id, get_todo, None) if todo.id else None
+    todo = await write_db(save_todo, todo)
+    card_cache.invalidate('todo', todo.id)
+    row_cache.invalidate('todo', todo.id)
+    anchor = None if old and old.due==todo.due else await in_db(todo_anchor, todo)
+    # Subscribers may or may not have the card, so theirs always drops it before inserting. The requester gets the
+    # same swaps over both the event stream and this reply, in either order, so both must be delete-then-insert.
+    swaps = mk_todo_swap(todo, anchor, moved=anchor is not None)
+    todo_events.publish(todo.project_id, *swaps)
+    return *swaps, form
 
 @rt 
 async def toggle_done(id:int):
     "Reverses done boolean in the database and returns the todo (rendered with __ft__)"
-    existing = db.todos[id]
-    updated = db.todos.update({
-        'id': id,
-        'done': not existing.done,
-        'title': existing.title,
-        'due': existing.due,
-        'project_id': existing.project_id
-    })
-    return TodoCard(updated.due, updated.done, updated.title, updated.id)
+    updated = await write_db(toggle_todo, id)
+    card_cache.invalidate('todo', id)
+    row_cache.invalidate('todo', id)
+    todo_events.publish(updated.project_id, *mk_todo_swap(updated))
+    return CachedTodoCard(updated.due, updated.done, updated.title, updated.id)
+
+
+async def refresh_todos(project_id):
+    "The project's list redone from its first page, sent once to everyone looking at it and returned to the requester"
+    grid = mk_todo_grid(*await in_db(todos_page, project_id))
+    todo_events.publish(project_id, grid)
+    return grid
+
+@rt
+async def complete_all(project_id:int):
+    "Marks every open todo of the project done, in one statement"
+    await write_db(complete_todos, project_id)
+    return await refresh_todos(project_id)
+
+@rt
+async def delete_completed(project_id:int):
+    "Deletes every completed todo of the project, in one statement"
+    for id in await write_db(delete_done_todos, project_id):
+        card_cache.invalidate('todo', id)
+        row_cache.invalidate('todo', id)
+    return await refresh_todos(project_id)
+
+async def run_import(job, project_id, rows):
+    "Writes an upload a chunk per transaction, reporting after each, then sends the new list once at the end"
+    loop,done = asyncio.get_running_loop(),0
+    def progress(n):
+        nonlocal done
+        done = n
+        loop.call_soon_threadsafe(lambda: import_jobs.publish(job, mk_import_status(n, len(rows))))
+    try: n = await in_db(import_todos, project_id, rows, progress)
+    except Exception as e:
+        # The chunks committed before the failure stay, so the list is redone if there were any
+        msg = mk_import_done(f'Import stopped after {done:,} of {len(rows):,} todos: {e}', error=True)
+        return import_jobs.publish(job, msg, *([await refresh_todos(project_id)] if done else []))
+    import_jobs.publish(job, mk_import_done(f'Imported {n:,} todos'), await refresh_todos(project_id))
+
+@rt('/import_todos')
+async def start_import(project_id:int, file:UploadFile):
+    "Parses an uploaded CSV or JSON file of todos, and imports them after responding with where to follow it"
+    try: rows = await asyncio.to_thread(parse_todos, file.filename or '', await file.read())
+    except (ValueError, UnicodeDecodeError) as e: return mk_import_done(f'Nothing imported: {e}', error=True)
+    if not rows: return mk_import_done('Nothing to import')
+    job = import_jobs.start()
+    return mk_import_progress(job), BackgroundTask(run_import, job, project_id, rows)
 
+@rt('/import/{job}/events')
+async def import_events(job:str):
+    "Server-sent progress of an import, ending with its result"
+    return EventStream(import_jobs.stream(job, mk_import_done('Import finished')))
 
 @rt 
 async def edit_todo(id:int): 
-    todo = db.todos[id]
-    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"))
+    todo = await row_cache('todo', id, get_todo)
+    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"), id=tid(id))
 
-serve(port=5003)
+# `WORKERS=4 python main.py` serves with several processes sharing todos.db (no reload in that mode)
+if __name__ == '__main__' and (workers:=int(os.getenv('WORKERS', 1))) > 1:
+    import uvicorn
+    uvicorn.run('main:app', host='0.0.0.0', port=int(os.getenv('PORT', 5003)), workers=workers)
+else: serve(port=5003)
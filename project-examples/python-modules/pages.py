@@ -1,23 +1,70 @@
 from fasthtml.common import *
 from monsterui.all import *
-from components.forms import mk_todo_form, mk_project_form
-from components.cards import ProjectCard, TodoCard
+from components.forms import mk_todo_form, mk_project_form, mk_todo_search, mk_bulk_actions
+from components.cards import CachedProjectCard, CachedTodoCard, TodoCard, is_overdue, tid
 
 def mk_project_list(projects_list):
-    return Grid(*[ProjectCard(p.name, p.created, p.id) for p in projects_list], cols=1)
+    return Grid(*[CachedProjectCard(p.name, p.created, p.id, p.total, p.done, p.overdue) for p in projects_list], cols=1)
 
 def ProjectPage(projects_list):
     return Titled('Projects', mk_project_form(), Div(mk_project_list(projects_list), id='project-list'))
 
 
-def mk_todo_list(project_id, todos_list):  
-    return Grid(*[TodoCard(t.due, t.done, t.title, t.id) for t in todos_list], cols=1)
+def mk_todo_page(todos_list, next_url=None):
+    "Cards for one page of todos, ending in a sentinel that fetches `next_url` when revealed"
+    cards = [CachedTodoCard(t.due, t.done, t.title, t.id) for t in todos_list]
+    if next_url: cards.append(Div(hx_get=next_url, hx_trigger='revealed', hx_swap='outerHTML'))
+    else: cards.append(Div(id='todo-list-end'))
+    return cards
 
+def mk_search_results(todos_list):
+    "Ranked search hits in place of the list's cards, ending in a `todo-list-end` marked as holding a search"
+    cards = [CachedTodoCard(t.due, t.done, t.title, t.id) for t in todos_list] or [P('No matching todos', cls=TextPresets.muted_sm)]
+    return *cards, Div(id='todo-list-end', data_search='true')
 
-def ProjectTodosPage(name, project_id, todos_list):
+# Hits aren't in `(due, id)` order, so while they are shown the OOB swaps that insert a card before its successor
+# (or the end) are dropped. Swaps of a card in place, removals and the whole grid redone still go through.
+SKIP_INSERTS = ("if (htmx.find('#todo-list-end[data-search]') && event.detail.fragment.firstElementChild"
+                " && event.detail.fragment.firstElementChild.id !== event.detail.target.id) event.preventDefault()")
+
+def mk_todo_swap(t, anchor=None, moved=False):
+    "OOB swaps for a saved todo: replaced in place, or (re)inserted before the element with id `anchor`"
+    card = TodoCard.__wrapped__(t.due, t.done, t.title, t.id, is_overdue(t.due))  # FT, so it can take `hx_swap_oob`
+    if anchor is None: return card(hx_swap_oob='true'),
+    card = Div(card, hx_swap_oob=f'beforebegin:#{anchor}')
+    return (mk_todo_removal(t.id), card) if moved else (card,)
+
+def mk_todo_removal(id): return Div(id=tid(id), hx_swap_oob='delete')
+
+def mk_todo_grid(todos_list, next_url=None):
+    "The whole list redone from its first page, as one OOB swap, after a change to many todos at once"
+    return Grid(*mk_todo_page(todos_list, next_url), cols=1, id='todo-grid', hx_swap_oob='true')
+
+def mk_import_progress(job):
+    "Where an import's progress goes, following its event stream until the last message replaces it"
+    return Div(Div(Progress(value=0, max=1), id='import-status'), id='import-progress',
+               hx_ext='sse', sse_connect=f'/import/{job}/events', sse_swap='message', hx_swap='none')
+
+def mk_import_status(n, total):
+    return Div(Progress(value=n, max=total), P(f'Imported {n:,} of {total:,} todos', cls=TextPresets.muted_sm),
+               id='import-status', hx_swap_oob='true')
+
+def mk_import_done(msg, error=False):
+    "The import's final state, without the stream attributes so the page stops listening"
+    return Div(P(msg, cls='text-red-500' if error else TextPresets.muted_sm), id='import-progress', hx_swap_oob='true')
+
+
+def ProjectTodosPage(name, project_id, *cards):
+    "The project's page around `cards`: a page from `mk_todo_page`, or `Rows` streaming them in"
     return Titled(
         f'{name} - Todos',
         A('← Back to Projects', href='/', cls='mb-4 inline-block'),
         mk_todo_form(project_id),
-        Div(mk_todo_list(project_id, todos_list), id='todo-list')
+        mk_bulk_actions(project_id),
+        mk_todo_search(project_id),
+        # OOB swaps pushed for other clients' changes; a lagging client is told to `resync` and refetches the list
+        Div(Div(Grid(*cards, cols=1, id='todo-grid'), id='todo-list', hx_get=f'/project/{project_id}',
+                hx_select='#todo-list', hx_trigger='sse:resync', hx_swap='outerHTML'),
+            hx_ext='sse', sse_connect=f'/project/{project_id}/events', sse_swap='message', hx_swap='none',
+            hx_on__oob_before_swap=SKIP_INSERTS)
     )
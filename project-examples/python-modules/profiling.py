@@ -0,0 +1,143 @@
+"""Opt-in profiling of single requests in production, for the slow one that won't reproduce locally.
+
+With `PROFILE_KEY` set, a request carrying a valid `X-Profile` header (from `python profiling.py sign /project/1`)
+is profiled: a thread samples the stacks of the event loop and the db threads every `PROFILE_INTERVAL` seconds,
+and tracemalloc traces what it allocates. Each profile is written to `PROFILE_DIR` as collapsed stacks (`.cpu.folded`,
+sample counts, and `.alloc.folded`, bytes still allocated at the end) for flamegraph.pl, inferno or speedscope, plus a
+`.txt` summary of the FT, MonsterUI and db functions that dominated. Its name is sent back in the `X-Profile` header.
+Without `PROFILE_KEY` nothing is installed, so other requests pay nothing at all.
+
+Other requests running at the same time share the loop and the db threads, so their work shows up in the profile
+too; only one request is profiled at a time."""
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+import asyncio, hashlib, hmac, os, re, sys, threading, time, tracemalloc
+
+PROFILE_KEY = os.getenv('PROFILE_KEY', '').encode()
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', 'profiles'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', .001))
+ALLOC_FRAMES = 32
+# Frames of these files are counted towards the summary's categories
+CATEGORIES = dict(ft=('/fastcore/xml.py', '/fasthtml/components.py', '/fasthtml/xtend.py'),
+                  monsterui=('/monsterui/',), db=('/db.py', '/apswutils/', '/fastlite/'))
+IDLE = ('selectors.py', 'threading.py', 'queue.py', 'concurrent/futures/thread.py')  # a thread waiting for work
+
+def signature(method, path, expires):
+    return hmac.new(PROFILE_KEY, f'{expires}:{method} {path}'.encode(), hashlib.sha256).hexdigest()
+
+def sign(path, method='GET', ttl=300):
+    "The `X-Profile` header value asking to profile `method path` within the next `ttl` seconds"
+    expires = int(time.time())+ttl
+    return f'{expires}:{signature(method, path, expires)}'
+
+def verify(method, path, value):
+    expires,_,sig = value.partition(':')
+    if not expires.isdigit() or int(expires) < time.time(): return False
+    return hmac.compare_digest(sig, signature(method, path, int(expires)))
+
+_names = {}
+def frame_name(code):
+    "`package/module.py:qualname` of a code object, cached as it's asked for once per frame per sample"
+    if (name:=_names.get(code)) is None:
+        p = Path(code.co_filename)
+        name = _names[code] = f'{p.parent.name}/{p.name}:{code.co_qualname}'.replace(';', ',')
+    return name
+
+def frame_name_of(f):
+    "`frame_name` for a tracemalloc frame, which has the file and line but not the function"
+    p = Path(f.filename)
+    return f'{p.parent.name}/{p.name}:{f.lineno}'
+
+def stack(frame):
+    "Names of `frame` and its callers, outermost first"
+    res = []
+    while frame is not None:
+        res.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return res[::-1]
+
+class Sampler:
+    "Counts the stacks of the threads `threads()` returns (`{ident: label}`) every `interval` seconds until stopped"
+    def __init__(self, threads, interval=PROFILE_INTERVAL):
+        self.threads,self.interval,self.stacks,self.n,self.done = threads,interval,Counter(),0,threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profile-sampler', daemon=True)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frames,self.n = sys._current_frames(),self.n+1
+            for ident,label in self.threads().items():
+                if (f:=frames.get(ident)) is None or f.f_code.co_filename.endswith(IDLE): continue
+                self.stacks[(label, *stack(f))] += 1
+
+    def __enter__(self): self.thread.start(); return self
+    def __exit__(self, *exc): self.done.set(); self.thread.join()
+
+def db_threads():
+    return {t.ident: t.name for t in threading.enumerate() if t.name.startswith('db')}
+
+def folded(counts):
+    "Collapsed stacks, one `frame;frame;... count` line each, the input flamegraph tools take"
+    return ''.join(f'{";".join(k)} {v}\n' for k,v in counts.most_common())
+
+def summary(req, took, sampler, allocs, peak):
+    "The request, then the functions of each category in the most samples, and the lines that allocated the most"
+    lines = [req, f'{took*1e3:.1f} ms, {sampler.n} sample rounds every {sampler.interval*1e3:g} ms, '
+                  f'{sum(sampler.stacks.values())} busy thread samples, traced allocation peak {peak/1024:.0f} KiB', '']
+    for cat,files in CATEGORIES.items():
+        # Inclusive: a sample counts once for each function of the category anywhere on its stack
+        tot = Counter()
+        for k,v in sampler.stacks.items():
+            for name in {o for o in k[1:] if any(f in '/'+o.partition(':')[0] for f in files)}: tot[name] += v
+        lines += [f'{cat}:'] + [f'  {v:6} {name}' for name,v in tot.most_common(10)] + ['']
+    lines.append('allocated, still live at the end:')
+    lines += [f'  {st.size/1024:8.1f} KiB {st.count:7} blocks {st.traceback[-1]}' for st in allocs.statistics('lineno')[:15]]
+    return '\n'.join(lines)+'\n'
+
+class RequestProfiler:
+    "ASGI middleware profiling requests that carry a valid `X-Profile` header, one at a time"
+    def __init__(self, app): self.app,self.lock = app,threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http': return await self.app(scope, receive, send)
+        value = next((v for k,v in scope['headers'] if k==b'x-profile'), None)
+        if value is None or not verify(scope['method'], scope['path'], value.decode('latin-1')) or not self.lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        try: await self.profile(scope, receive, send)
+        finally: self.lock.release()
+
+    async def profile(self, scope, receive, send):
+        name = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{scope["method"]}-{re.sub(r"[^\w.-]+", "_", scope["path"]).strip("_") or "index"}'
+        async def _send(msg):
+            if msg['type']=='http.response.start': msg['headers'] = [*msg.get('headers', []), (b'x-profile', name.encode())]
+            await send(msg)
+        loop,tracing = threading.get_ident(),tracemalloc.is_tracing()
+        if not tracing: tracemalloc.start(ALLOC_FRAMES)
+        start = time.perf_counter()
+        try:
+            with Sampler(lambda: {loop: 'loop'} | db_threads()) as sampler: await self.app(scope, receive, _send)
+        finally:
+            took = time.perf_counter()-start
+            req = f'{scope["method"]} {scope["path"]}{"?"+scope["query_string"].decode("latin-1") if scope["query_string"] else ""}'
+            # The snapshot, its statistics and the writes take a while, so the loop serves other requests meanwhile
+            await asyncio.to_thread(self.write, name, req, took, sampler, tracing)
+
+    def write(self, name, req, took, sampler, tracing):
+        "Save the request's CPU and allocation profiles and their summary as `name.*` in `PROFILE_DIR`"
+        allocs,peak = tracemalloc.take_snapshot(),tracemalloc.get_traced_memory()[1]
+        if not tracing: tracemalloc.stop()
+        allocs = allocs.filter_traces([tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)])
+        alloc_stacks = Counter()
+        for st in allocs.statistics('traceback'): alloc_stacks[tuple(map(frame_name_of, st.traceback))] += st.size
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        (PROFILE_DIR/f'{name}.cpu.folded').write_text(folded(sampler.stacks))
+        (PROFILE_DIR/f'{name}.alloc.folded').write_text(folded(alloc_stacks))
+        (PROFILE_DIR/f'{name}.txt').write_text(summary(req, took, sampler, allocs, peak))
+
+def install(app):
+    "Profile `app`'s requests on demand if `PROFILE_KEY` is set, else leave it untouched"
+    if PROFILE_KEY: app.add_middleware(RequestProfiler)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'sign' or not PROFILE_KEY: sys.exit('usage: PROFILE_KEY=... python profiling.py sign PATH [METHOD] [TTL]')
+    print(f'X-Profile: {sign(sys.argv[2], *(sys.argv[3:4] or ["GET"]), *map(int, sys.argv[4:5]))}')
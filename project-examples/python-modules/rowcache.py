@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from time import monotonic, perf_counter
+from fasthtml.common import *
+from db import in_db, table_versions
+
+class RowCache:
+    """Read-through LRU of point lookups by `(kind, id)`, each kept at most `ttl` seconds. A kind is a table name:
+    its `table_versions` counter changes when any connection in any worker process writes to the table, so the
+    kind's entries are dropped on the first lookup after that; write routes also `invalidate` what they change.
+    A lookup that hits skips the db pool altogether."""
+    def __init__(self, max_items=4096, ttl=60):
+        self.max_items,self.ttl,self.items,self.versions = max_items,ttl,OrderedDict(),{}
+        self.hits,self.misses,self.expired,self.fetch_time = 0,0,0,0.
+
+    async def __call__(self, kind, id, fetch, default=UNSET):
+        "`fetch(id)` on the db pool, or what it returned last time; `NotFoundError`s (or `default`) aren't cached"
+        if (version:=table_versions()[kind]) != self.versions.get(kind): self.clear(kind); self.versions[kind] = version
+        key = kind,id
+        if (hit:=self.items.get(key)) is not None:
+            if hit[1] > monotonic():
+                self.hits += 1
+                self.items.move_to_end(key)
+                return hit[0]
+            self.expired += 1
+            del self.items[key]
+        self.misses += 1
+        start = perf_counter()
+        try: row = await in_db(fetch, id)
+        except NotFoundError:
+            if default is UNSET: raise
+            return default
+        finally: self.fetch_time += perf_counter()-start
+        # A write that lands meanwhile bumps the version, so the next lookup clears this row anyway
+        if self.versions[kind]==version:
+            self.items[key] = row,monotonic()+self.ttl
+            if len(self.items) > self.max_items: self.items.popitem(last=False)
+        return row
+
+    def invalidate(self, kind, id): self.items.pop((kind,id), None)
+
+    def clear(self, kind):
+        for key in [o for o in self.items if o[0]==kind]: del self.items[key]
+
+    def stats(self):
+        total,per_fetch = self.hits+self.misses,self.fetch_time/self.misses if self.misses else 0.
+        return dict(hits=self.hits, misses=self.misses, expired=self.expired, hit_rate=self.hits/total if total else 0.,
+                    entries=len(self.items), fetch_seconds=self.fetch_time, saved_seconds=self.hits*per_fetch)
+
+row_cache = RowCache()
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+import re
+from db import data_version, in_db, search_todo_rows
+
+SEARCH_LIMIT = 20
+MAX_TERMS = 8
+MIN_PREFIX = 2  # a one letter prefix matches most rows, which all have to be ranked, and isn't in the prefix index
+
+def search_terms(q):
+    "The words of a search box's text, which FTS5 will match case and accent insensitively, minus a too short last one"
+    terms = re.findall(r'\w+', q.casefold())[:MAX_TERMS]
+    return tuple(terms[:-1] if terms and len(terms[-1]) < MIN_PREFIX else terms)
+
+class SearchCache:
+    """LRU of search results by `(project_id, terms)`, for the same prefixes typed, retyped after a backspace, or
+    typed by several people. Every entry is dropped as soon as any connection commits to the db."""
+    def __init__(self, max_items=256): self.max_items,self.items,self.version,self.hits,self.misses = max_items,OrderedDict(),None,0,0
+
+    async def __call__(self, project_id, terms, limit=SEARCH_LIMIT):
+        if (version:=data_version()) != self.version: self.items.clear(); self.version = version
+        key = project_id,terms,limit
+        if (rows:=self.items.get(key)) is not None:
+            self.hits += 1
+            self.items.move_to_end(key)
+            return rows
+        self.misses += 1
+        rows = await in_db(search_todo_rows, project_id, terms, limit)
+        # A write that lands meanwhile bumps the version, so the next lookup clears these rows anyway
+        if self.version==version:
+            self.items[key] = rows
+            if len(self.items) > self.max_items: self.items.popitem(last=False)
+        return rows
+
+    def stats(self):
+        total = self.hits+self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits/total if total else 0., entries=len(self.items))
+
+search_cache = SearchCache()
@@ -0,0 +1,57 @@
+"""Streamed rendering for pages with a long list in them.
+
+A `Rows` child stands in for FT items produced by an async iterator. `stream_page` wraps the tree into a page
+the way fasthtml does and renders it with `to_xml`, each `Rows` as a placeholder comment. What's around the
+placeholders goes out as is, so the page's start is sent before the first item is even fetched, and the items are
+rendered and flushed as they arrive rather than held in one string."""
+from fasthtml.common import *
+import re
+
+CHUNK_SIZE = 16384  # characters buffered before a flush, so rows don't go out one tiny chunk at a time
+
+class Rows:
+    "FT children produced one at a time by the async iterator `src`"
+    def __init__(self, src): self.src = src
+    def __ft__(self): return Safe(f'<!--rows-{id(self)}-->')
+
+def find_rows(elm):
+    "Each `Rows` in `elm`, by its `id`"
+    if isinstance(elm, Rows): return {id(elm): elm}
+    cs = elm if isinstance(elm, (tuple,list)) else elm.children if isinstance(elm, FT) else ()
+    return merge(*map(find_rows, cs))
+
+async def stream_xml(elm, chunk_size=CHUNK_SIZE):
+    "Render `elm` in chunks of about `chunk_size` characters, flushing what's ready before waiting on any `Rows`"
+    rows = find_rows(elm)
+    # `split` with a group alternates the text between placeholders with the ids of the `Rows` they stand for
+    parts = re.split(r'<!--rows-(\d+)-->', to_xml(elm, indent=fh_cfg.indent))
+    buf,n = [],0
+    for i,part in enumerate(parts):
+        if i%2==0:
+            buf.append(part); n += len(part)
+            continue
+        if buf: yield ''.join(buf)
+        buf,n = [],0
+        async for o in rows[int(part)].src:
+            buf.append(s:=str(to_xml(o, indent=fh_cfg.indent))); n += len(s)
+            if n >= chunk_size:
+                yield ''.join(buf)
+                buf,n = [],0
+    if buf: yield ''.join(buf)
+
+def merge_headers(*hdrs):
+    "Merge header dicts on lowercased names, with the `Vary` lists combined rather than replaced"
+    res = {}
+    for k,v in ((k.lower(),v) for o in hdrs for k,v in (o or {}).items()):
+        res[k] = ', '.join(dict.fromkeys(res[k].split(', ') + v.split(', '))) if k=='vary' and k in res else v
+    return res
+
+def stream_page(req, *cts, headers=None):
+    "A streamed response of `cts`, in a full page with the app's headers unless htmx asked for a fragment"
+    heads,bdy = partition(cts, lambda o: getattr(o, 'tag', '') in ('title','meta','link','style','base'))
+    if not is_full_page(req, cts):
+        title = [] if any(getattr(o, 'tag', '')=='title' for o in heads) else [Title(req.app.title)]
+        canonical = [Link(rel='canonical', href=getattr(req, 'canonical', req.url))] if req.app.canonical else []
+        cts = respond(req, [*heads, *title, *canonical], bdy)
+    return StreamingResponse(stream_xml(cts), media_type='text/html; charset=utf-8',
+                             headers=merge_headers({'vary': 'HX-Request, HX-History-Restore-Request'}, headers))
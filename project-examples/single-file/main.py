@@ -1,8 +1,50 @@
 from fasthtml.common import *
 from datetime import date,datetime
 from monsterui.all import *
-
-app, rt = fast_app(hdrs=Theme.slate.headers())
+import copy, json, mimetypes
+
+# Filled in by `vendor_assets.py`; without it pages keep loading their assets from the CDN
+PUBLIC = Path(__file__).parent.parent/'public'
+manifest = json.loads((PUBLIC/'manifest.json').read_text()) if (PUBLIC/'manifest.json').exists() else {}
+vendored = set(manifest.values())
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+def local_hdrs(*hdrs):
+    "`hdrs`, with the `src`/`href` of each vendored asset pointing at its local copy"
+    res = []
+    for h in hdrs:
+        k = 'src' if 'src' in h.attrs else 'href'
+        if name:=manifest.get(h.attrs.get(k)):
+            h = copy.copy(h)  # the fasthtml and theme headers are shared, so never edited in place
+            h.attrs = {**h.attrs, k: f'/public/{name}'}
+        res.append(h)
+    return res
+
+def accepted(accept_encoding):
+    "`{coding: q}` from an `Accept-Encoding` header"
+    res = {}
+    for part in accept_encoding.split(','):
+        coding,_,params = part.partition(';')
+        try: q = float(params.split('=', 1)[1]) if 'q=' in params else 1.
+        except ValueError: q = 0.
+        if coding:=coding.strip().lower(): res[coding] = q
+    return res
+
+async def public(req):
+    "A vendored asset, precompressed when the client takes that. Its name changes with its content, so it's cached for good"
+    fname = req.path_params['fname']
+    if fname not in vendored: return Response('Not found', 404)
+    hdrs,acc = {'Cache-Control': IMMUTABLE, 'Vary': 'Accept-Encoding'},accepted(req.headers.get('accept-encoding', ''))
+    q = lambda coding: acc.get(coding, acc.get('*', 0))
+    # Highest q-value first; `sorted` is stable, so brotli wins a tie
+    for coding,suffix in sorted((('br','.br'),('gzip','.gz')), key=lambda o: -q(o[0])):
+        if q(coding) > 0 and (path:=PUBLIC/(fname+suffix)).exists():
+            return FileResponse(path, headers=hdrs|{'Content-Encoding': coding}, media_type=mimetypes.guess_type(fname)[0])
+    return FileResponse(PUBLIC/fname, headers=hdrs)
+
+app, rt = fast_app(hdrs=local_hdrs(*def_hdrs(), *Theme.slate.headers()), default_hdrs=False)
+# Ahead of fasthtml's catch-all static route
+app.router.routes.insert(0, Route('/public/{fname}', public))
 
 class Project:
     id: int
@@ -19,10 +61,49 @@ class Todo:
 db = database('todos.db')
 db.projects = db.create(Project)
 db.todos = db.create(Todo)
+db.todos.create_index(['project_id', 'due'], if_not_exists=True)
+
+# Per-route phase timings on `/metrics` with `METRICS=1`, from the `metrics.py` the layouts share
+if os.getenv('METRICS'):
+    sys.path.append(str(Path(__file__).parent.parent))
+    from metrics import phase_metrics
+    phase_metrics.install(app, db)
 
 def tid(id): return f'todo-{id}'
 
-def mk_todo_list(project_id):  return Grid(*(map(TodoCard,db.todos(where=f'project_id={project_id}', order_by='due'))), cols=1)
+def todos_for_project(project_id, after=None, limit=None):
+    "Todos of a project in `(due, id)` order, after the `(due, id)` key `after` if given; the index serves both"
+    if after is None: return db.todos(where='project_id=?', where_args=[project_id], order_by='due, id', limit=limit)
+    return db.todos(where='project_id=? and (due,id)>(?,?)', where_args=[project_id, *after], order_by='due, id', limit=limit)
+
+def next_todo(todo): return first(todos_for_project(todo.project_id, (todo.due, todo.id), 1))
+
+def toggle_todo(id):
+    "Flip `done` in one atomic statement, so concurrent toggles can't lose updates"
+    if row:=first(db.q(f'update {db.todos} set done = not done where id=? returning *', [id])): return Todo(**row)
+    raise NotFoundError()
+
+PAGE_SIZE = 50
+
+def mk_todo_page(project_id, due=None, id=None, page_size=PAGE_SIZE):
+    "One keyset page of todos after `(due, id)`, ending in a sentinel that fetches the next page when revealed"
+    todos = todos_for_project(project_id, None if due is None else (due,id), page_size+1)
+    cards = list(map(TodoCard, todos[:page_size]))
+    if len(todos) > page_size:
+        last = todos[page_size-1]
+        cards.append(Div(hx_get=more_todos.to(project_id=project_id, due=last.due, id=last.id),
+                         hx_trigger='revealed', hx_swap='outerHTML'))
+    else: cards.append(Div(id='todo-list-end'))
+    return cards
+
+def mk_todo_list(project_id):  return Grid(*mk_todo_page(project_id), cols=1)
+
+def mk_todo_swap(todo, old=None):
+    "OOB swaps that put a saved todo's card in its `(due, id)` position without re-rendering the list"
+    if old and old.due==todo.due: return TodoCard(todo)(hx_swap_oob='true'),
+    nxt = next_todo(todo)
+    card = Div(TodoCard(todo), hx_swap_oob=f"beforebegin:#{tid(nxt.id) if nxt else 'todo-list-end'}")
+    return (Div(id=tid(todo.id), hx_swap_oob='delete'), card) if old else (card,)
 
 @app.delete
 async def delete_todo(id:int):
@@ -92,15 +173,23 @@ async def project_todos(project_id: int):
         Div(mk_todo_list(project_id), id='todo-list')
     )
 
+@rt
+async def more_todos(project_id:int, due:str, id:int):
+    "Next page of todos, swapped in place of the sentinel that requested it"
+    return tuple(mk_todo_page(project_id, due, id))
+
 @rt 
 async def upsert_todo(todo:Todo):
-    if todo.title.strip(): db.todos.insert(todo,replace=True)
-    return mk_todo_list(todo.project_id),mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    "Saves the todo and returns only its card, swapped into place out of band, plus a fresh form"
+    form = mk_todo_form(todo.project_id)(hx_swap_oob='true',hx_target='#todo-input',hx_swap='outerHTML')
+    if not todo.title.strip(): return form
+    old = db.todos.get(todo.id, default=None) if todo.id else None
+    return *mk_todo_swap(db.todos.insert(todo,replace=True), old), form
 
 @rt 
 async def toggle_done(id:int):
     "Reverses done boolean in the database and returns the todo (rendered with __ft__)"
-    return TodoCard(db.todos.update(Todo(id=id, done=not db.todos[id].done)))
+    return TodoCard(toggle_todo(id))
 
 def mk_todo_form(project_id, todo=None, btn_text="Add"):
     """Create a form for todo creation/editing with optional pre-filled values"""
@@ -116,12 +205,12 @@ def mk_todo_form(project_id, todo=None, btn_text="Add"):
         
     return Form(DivLAligned(
         *inputs,
-        Button(btn_text, cls=ButtonT.primary, post=upsert_todo,hx_target='#todo-list', hx_swap='innerHTML')),
+        Button(btn_text, cls=ButtonT.primary, post=upsert_todo, hx_swap='none')),
         id='todo-input', cls='mb-6')
 
 @rt 
 async def edit_todo(id:int): 
     todo = db.todos[id]
-    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"))
+    return Card(mk_todo_form(todo.project_id, todo, btn_text="Save"), id=tid(id))
 
 serve()
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""No layout's queries scan the todos or sort in a temp b-tree: each app is driven through its routes, and every
+select, update and delete it ran is put through `EXPLAIN QUERY PLAN` with the values it ran with.
+
+Each layout runs in its own process, on a fresh copy that creates its own `todos.db`: `python test_query_plans.py LAYOUT`
+prints the offending statements and plans as JSON."""
+import json, re, shutil, subprocess, sys
+from pathlib import Path
+import pytest
+
+root = Path(__file__).parent
+layouts = ['single-file', 'api-router', 'global-app', 'python-modules']
+# What may be scanned whole: the index page lists every project (`p`) with the per-project totals of `todo_counts`
+# (`c`), `table_versions` has a row per table, and `CONSTANT ROW` is a select without a table
+FULL_SCANS = {'project', 'p', 'c', 'todo_counts', 'table_versions', 'CONSTANT'}
+HX = {'HX-Request': 'true'}
+# The routes of any layout, in an order that leaves rows for the next one to act on; a layout without one 404s
+REQUESTS = [('get', '/', {}), ('post', '/create_project', dict(name='p')),
+            *(('post', '/upsert_todo', dict(title=f't{i}', done='', due=f'2030-01-0{i}', project_id=1)) for i in range(1, 4)),
+            ('post', '/upsert_todo', dict(id=1, title='t1', done='', due='2030-02-01', project_id=1)),
+            ('get', '/', {}), ('get', '/project/1', {}), ('get', '/more_todos?project_id=1&due=2030-01-02&id=2', {}),
+            ('get', '/toggle_done?id=2', {}), ('get', '/edit_todo?id=2', {}), ('get', '/search_todos?project_id=1&q=t', {}),
+            ('post', '/complete_all', dict(project_id=1)), ('post', '/delete_completed', dict(project_id=1)),
+            ('delete', '/delete_todo?id=3', {})]
+
+def bad_plans():
+    "`[sql, plan]` of each statement the app in the cwd ran whose plan scans a table or sorts"
+    import apsw
+    ran = {}
+    def trace(cursor, sql, bindings):
+        ran.setdefault(sql, bindings)
+        return True
+    apsw.connection_hooks.append(lambda conn: setattr(conn, 'exec_trace', trace))
+    sys.path.insert(0, '.')
+    import main
+    from fasthtml.common import Client
+    c = Client(main.app)
+    for method,path,data in REQUESTS:
+        r = getattr(c, method)(path, headers=HX, **({'data': data} if data else {}))
+        if r.status_code >= 500: raise AssertionError(f'{method} {path}: {r.status_code}')
+    # Planned against a realistic spread of rows: on a handful, the stats `pragma optimize` gathers favour scans
+    db,res = apsw.Connection('todos.db'),[]
+    with db:
+        db.executemany('insert into project (name, created) values (?, ?)', ((f'p{i}', '2030-01-01') for i in range(50)))
+        db.executemany('insert into todo (title, done, due, project_id) values (?, ?, ?, ?)',
+                       ((f't{i}', i%3==0, f'2030-{i%12+1:02}-{i%28+1:02}', i%50+1) for i in range(5000)))
+    db.execute('analyze')
+    for sql,bindings in list(ran.items()):  # the explains are traced too
+        if not re.match(r'\s*(select|update|delete)\b', sql, re.I) or re.search(r'sqlite_(master|schema)|pragma', sql, re.I): continue
+        plan = [o[3] for o in db.execute(f'explain query plan {sql}', bindings)]
+        if any((o.startswith('SCAN') and 'VIRTUAL TABLE' not in o and o.split()[1] not in FULL_SCANS) or 'TEMP B-TREE' in o for o in plan):
+            res.append([sql, plan])
+    return res
+
+@pytest.mark.parametrize('layout', layouts)
+def test_query_plans(layout, tmp_path):
+    d = tmp_path/layout
+    shutil.copytree(root/layout, d, ignore=shutil.ignore_patterns('__pycache__', 'todos.db*', '.sesskey'))
+    r = subprocess.run([sys.executable, __file__, layout], cwd=d, capture_output=True, text=True)
+    assert r.returncode==0, r.stderr
+    assert json.loads(r.stdout.splitlines()[-1])==[]
+
+if __name__ == '__main__': print(json.dumps(bad_plans()))
@@ -0,0 +1,70 @@
+"""Vendor the CDN scripts and stylesheets the example apps and the notebook load, for deployments without outbound network.
+
+Each asset is saved to `public/` under a content-hashed name (`core.min.3f1c2a9b0d.css`), scripts and stylesheets
+next to precompressed `.gz` (and `.br`, with brotli installed) copies, and `public/manifest.json` maps each CDN URL to
+its file. Stylesheets have the files they `url(...)` vendored too. The apps' `local_hdrs` point their headers at these copies and serve them
+with `Cache-Control: immutable`, as a new version gets a new name; without a manifest they keep using the CDN.
+
+    python vendor_assets.py
+"""
+import gzip, hashlib, json, mimetypes, re
+from pathlib import Path, PurePosixPath
+from urllib.parse import urljoin, urlsplit
+import httpx
+from fasthtml.common import def_hdrs
+from monsterui.all import Theme
+try: import brotli
+except ImportError: brotli = None
+
+PUBLIC = Path(__file__).parent/'public'
+# Loaded outside `def_hdrs` and the theme: the SSE extension of python-modules, and the notebook's Tailwind
+EXTRA = ('https://cdn.jsdelivr.net/npm/htmx-ext-sse@2.2.3/sse.js', 'https://cdn.tailwindcss.com')
+# Text assets, also precompressed; `mimetypes` doesn't know every spelling of JavaScript
+TEXT = {'text/css': '.css', 'text/javascript': '.js', 'application/javascript': '.js', 'application/x-javascript': '.js'}
+_css_url = re.compile(rb'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+def cdn_urls(hdrs):
+    "The absolute `src`/`href`s of `hdrs`"
+    return [u for h in hdrs if (u:=h.attrs.get('src') or h.attrs.get('href')) and u.startswith(('http://', 'https://'))]
+
+def asset_name(url, ctype, data):
+    "`<name>.<hash><ext>`, with the extension from the content type as CDN paths needn't have one"
+    path = PurePosixPath(urlsplit(url).path)
+    mime = ctype.partition(';')[0].strip()
+    ext = TEXT.get(mime) or mimetypes.guess_extension(mime) or path.suffix
+    stem = path.name.removesuffix(ext)
+    # Bare versions (`cdn.tailwindcss.com/3.4.16`) get the site's name
+    if not stem[:1].isalpha(): stem = '-'.join(filter(None, (urlsplit(url).hostname.split('.')[-2], stem)))
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+
+def vendor(client, url, manifest):
+    "Download `url` (and what it references, for stylesheets) into `PUBLIC`, returning its file name"
+    if url in manifest: return manifest[url]
+    r = client.get(url)
+    r.raise_for_status()
+    ctype,data = r.headers.get('content-type', ''),r.content
+    if 'css' in ctype:
+        def _local(m):
+            if m[2].startswith((b'data:', b'#')): return m[0]
+            return b'url(%s)' % vendor(client, urljoin(str(r.url), m[2].decode()), manifest).encode()
+        data = _css_url.sub(_local, data)
+    name = manifest[url] = asset_name(url, ctype, data)
+    (PUBLIC/name).write_bytes(data)
+    if ctype.partition(';')[0].strip() in TEXT:
+        (PUBLIC/f'{name}.gz').write_bytes(gzip.compress(data, 9, mtime=0))
+        if brotli: (PUBLIC/f'{name}.br').write_bytes(brotli.compress(data, quality=11))
+    return name
+
+def main():
+    PUBLIC.mkdir(exist_ok=True)
+    manifest = {}
+    with httpx.Client(follow_redirects=True, timeout=60) as client:
+        for url in dict.fromkeys([*cdn_urls([*def_hdrs(), *Theme.slate.headers()]), *EXTRA]):
+            print(f'{url} -> {vendor(client, url, manifest)}')
+    # Earlier versions of the assets are no longer referenced by anything
+    keep = {'manifest.json', *manifest.values()}
+    for f in PUBLIC.iterdir():
+        if f.name.removesuffix('.gz').removesuffix('.br') not in keep: f.unlink()
+    (PUBLIC/'manifest.json').write_text(json.dumps(manifest, indent=2))
+
+if __name__ == '__main__': main()